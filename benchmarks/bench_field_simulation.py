@@ -0,0 +1,40 @@
+"""
+Benchmark of the team-final and all-around simulation modes: 100,000 simulations of the whole field of the database
+and of Olympic-sized finals (8 teams, 24 all-around gymnasts at most 2 per country), on one core. Run from the repository root:
+
+    python -m benchmarks.bench_field_simulation --simulations 100000
+"""
+import argparse
+import time
+
+from myProject.simulations import simulate_all_around, simulate_team_final
+from myProject.sqlPlots import query_pivoted_database
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    results = function(*args, **kwargs)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='gym')
+    parser.add_argument('--simulations', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = query_pivoted_database(args.database)
+    runs = [
+        ('team final, every country', simulate_team_final, {}),
+        ('team final, 8 teams', simulate_team_final, {'n_teams': 8}),
+        ('all-around, every gymnast', simulate_all_around, {}),
+        ('all-around, 24 finalists', simulate_all_around, {'n_finalists': 24}),
+    ]
+    for name, function, kwargs in runs:
+        results, elapsed = timed(function, df, n_simulations=args.simulations, seed=args.seed, **kwargs)
+        print(f'{name:28s} {len(results):4d} competitors  {args.simulations:,} simulations: {elapsed:6.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of the shipped monte_carlo engine against the original per-iteration pandas loop, both simulating every event of the pivot.
+
+Run from the repository root on a migrated 'gym' database:
+
+    python -m benchmarks.bench_monte_carlo
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from myProject.simulations import monte_carlo
+from myProject.sqlPlots import pivot_events, query_pivoted_database
+
+
+def legacy_monte_carlo(df, num_simulations):
+    """
+    The original monte_carlo loop, kept here only as the baseline of the benchmark. It runs the events of the pivot instead of the
+    hard-coded women's four, so it does the same work as monte_carlo when the database also has the men's events
+    """
+    LIST_OF_EVENTS = pivot_events(df)
+    df['gold'] = 0
+    df['silver'] = 0
+    df['bronze'] = 0
+
+    for i in range(num_simulations):
+        for event in LIST_OF_EVENTS:
+            event_data = df[df[f'{event}_PredictedScore'].notna()].copy()
+            event_data['simulated_score'] = event_data[f'{event}_PredictedScore'] + np.random.normal(0, 0.1, size=len(event_data))
+            event_data = event_data.sort_values(by='simulated_score', ascending=False).reset_index(drop=True)
+
+            df.loc[df['LastName'] == event_data.loc[0, 'LastName'], 'gold'] += 1
+            df.loc[df['LastName'] == event_data.loc[1, 'LastName'], 'silver'] += 1
+            df.loc[df['LastName'] == event_data.loc[2, 'LastName'], 'bronze'] += 1
+
+    return df.sort_values(by=['gold', 'silver', 'bronze'], ascending=False)
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='gym')
+    parser.add_argument('--legacy-simulations', type=int, default=100,
+                        help='simulations timed with the legacy loop; its cost is linear so larger counts are extrapolated')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='also time 1,000,000 seeded simulations with monte_carlo on this many worker processes')
+    args = parser.parse_args()
+
+    df = query_pivoted_database(args.database)
+    legacy_per_simulation = timed(legacy_monte_carlo, df.copy(), args.legacy_simulations) / args.legacy_simulations
+
+    print(f'{len(df)} athletes, {len(pivot_events(df))} events, legacy loop: {legacy_per_simulation * 1e3:.2f} ms per simulation')
+    for num_simulations in (1_000, 100_000):
+        shipped = timed(monte_carlo, df.copy(), num_simulations, seed=0)
+        legacy = legacy_per_simulation * num_simulations
+        print(f'{num_simulations:>7} simulations: legacy {legacy:9.2f} s, monte_carlo {shipped:7.3f} s, speedup {legacy / shipped:8.0f}x')
+    if args.workers:
+        parallel = timed(monte_carlo, df.copy(), 1_000_000, seed=0, n_workers=args.workers)
+        print(f'1000000 simulations on {args.workers} workers: {parallel:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark of the raw gym table aggregations before and after ensure_indexes. These are the queries that
+used to run on every call and that now only run when the athlete_apparatus_stats summary is rebuilt.
+
+Works on copies, so the shipped 'gym' database is never modified. Run from the repository root:
+
+    python -m benchmarks.bench_sqlite_indexes --rows 10000000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from myProject.sqlPlots import ensure_indexes
+
+COUNTRY_QUERY = '''
+    SELECT LastName, FirstName, Apparatus, AVG(Score), MAX(Score) AS Maxscore, COUNT(DISTINCT Date)
+    FROM gym WHERE Country = ? GROUP BY LastName, FirstName, Apparatus ORDER BY Apparatus, Maxscore DESC
+'''
+PIVOT_QUERY = '''
+    SELECT LastName, FirstName, Apparatus, AVG(Score), COUNT(DISTINCT Date), Country
+    FROM gym GROUP BY LastName, FirstName, Apparatus
+'''
+
+
+def make_synthetic(source, target, rows):
+    """
+    Copies the shipped table and grows it to the requested number of rows. Every copy renames its athletes
+    and spreads them over 100 variants of each country, so athletes and countries grow with the table
+    """
+    with sqlite3.connect(target) as conn:
+        conn.execute('ATTACH DATABASE ? AS source', (source,))
+        conn.execute('CREATE TABLE gym AS SELECT * FROM source.gym WHERE 0')
+        base_rows = conn.execute('SELECT COUNT(*) FROM source.gym').fetchone()[0]
+        copies = -(-rows // base_rows)
+        conn.execute(f'''
+            INSERT INTO gym
+            WITH RECURSIVE copy(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM copy WHERE n + 1 < {copies})
+            SELECT CASE WHEN n = 0 THEN LastName ELSE LastName || '_' || n END, FirstName, Gender,
+                   CASE WHEN n = 0 THEN Country ELSE Country || (n % 100) END,
+                   Date, Competition, Round, Location, Apparatus, Rank, D_Score, E_Score, Penalty, Score
+            FROM copy CROSS JOIN source.gym
+            LIMIT {rows}
+        ''')
+        conn.commit()
+        conn.execute('DETACH DATABASE source')
+    conn.close()
+
+
+def plans(database):
+    with sqlite3.connect(database) as conn:
+        for name, query, params in (('country', COUNTRY_QUERY, ('USA',)), ('pivot', PIVOT_QUERY, ())):
+            steps = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+            print(f'    {name:<8} plan: ' + ' | '.join(steps))
+    conn.close()
+
+
+def latency(database, query, params=(), repeat=3):
+    best = float('inf')
+    with sqlite3.connect(database) as conn:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(query, params).fetchall()
+            best = min(best, time.perf_counter() - start)
+    conn.close()
+    return best
+
+
+def report(label, database):
+    print(f'  {label}')
+    plans(database)
+    country = latency(database, COUNTRY_QUERY, ('USA',))
+    pivot = latency(database, PIVOT_QUERY, repeat=1)
+    print(f'    country aggregation: {country * 1e3:9.1f} ms   pivot aggregation: {pivot * 1e3:9.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='gym', help='shipped database to copy')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='rows in the synthetic table, 0 to skip it')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shipped = os.path.join(tmp, 'gym')
+        shutil.copyfile(args.database, shipped)
+        databases = [('shipped table', shipped)]
+        if args.rows:
+            synthetic = os.path.join(tmp, 'synthetic')
+            make_synthetic(shipped, synthetic, args.rows)
+            databases.append((f'synthetic {args.rows:,}-row table', synthetic))
+
+        for name, database in databases:
+            print(name)
+            report('before', database)
+            start = time.perf_counter()
+            ensure_indexes(database)
+            print(f'  ensure_indexes: {time.perf_counter() - start:.2f} s')
+            report('after', database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark of the gym table against the normalized athletes, competitions and results tables: file size of the raw rows,
+a grouped aggregation and a date-window query. The date window on the raw table has to parse every distinct Date string,
+the normalized one searches the competitions' parsed StartDate.
+
+Works on copies, so the shipped 'gym' database is never modified. Run from the repository root:
+
+    python -m benchmarks.bench_sqlite_normalized --rows 1000000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.bench_sqlite_indexes import latency, make_synthetic
+from myProject.db import register_functions
+from myProject.sqlPlots import normalize_database
+
+RAW_GROUPED = '''
+    SELECT LastName, FirstName, Country, Apparatus, AVG(Score), MAX(Score)
+    FROM gym GROUP BY LastName, FirstName, Country, Apparatus
+'''
+NORMALIZED_GROUPED = '''
+    SELECT athlete_id, Apparatus, AVG(Score), MAX(Score)
+    FROM results GROUP BY athlete_id, Apparatus
+'''
+RAW_WINDOW = '''
+    SELECT LastName, Apparatus, Score FROM gym
+    WHERE date_range_start(Date) BETWEEN '2022-02-01' AND '2022-03-31'
+'''
+NORMALIZED_WINDOW = '''
+    SELECT r.athlete_id, r.Apparatus, r.Score
+    FROM competitions AS c JOIN results AS r ON r.competition_id = c.competition_id
+    WHERE c.StartDate BETWEEN '2022-02-01' AND '2022-03-31'
+'''
+
+
+def data_size(database, tables):
+    with sqlite3.connect(database) as conn:
+        size = conn.execute(f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({', '.join('?' * len(tables))})", tables).fetchone()[0]
+    conn.close()
+    return size
+
+
+def timed(database, query):
+    conn = sqlite3.connect(database)
+    register_functions(conn)
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        conn.execute(query).fetchall()
+        best = min(best, time.perf_counter() - start)
+    conn.close()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='gym', help='shipped database to copy, gym must still be a table')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows in the synthetic table, 0 to skip it')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shipped = os.path.join(tmp, 'gym')
+        shutil.copyfile(args.database, shipped)
+        databases = [('shipped table', shipped)]
+        if args.rows:
+            synthetic = os.path.join(tmp, 'synthetic')
+            make_synthetic(shipped, synthetic, args.rows)
+            databases.append((f'synthetic {args.rows:,}-row table', synthetic))
+
+        for name, database in databases:
+            print(name)
+            raw_size = data_size(database, ('gym',))
+            grouped = timed(database, RAW_GROUPED)
+            window = timed(database, RAW_WINDOW)
+            print(f'  gym table           {raw_size / 1e6:8.2f} MB   grouped: {grouped * 1e3:9.1f} ms   date window: {window * 1e3:9.1f} ms')
+
+            start = time.perf_counter()
+            normalize_database(database)
+            print(f'  normalize_database: {time.perf_counter() - start:.2f} s')
+            normalized_size = data_size(database, ('athletes', 'competitions', 'results', 'results_competition', 'competitions_start_date'))
+            grouped = timed(database, NORMALIZED_GROUPED)
+            window = timed(database, NORMALIZED_WINDOW)
+            print(f'  normalized tables   {normalized_size / 1e6:8.2f} MB   grouped: {grouped * 1e3:9.1f} ms   date window: {window * 1e3:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
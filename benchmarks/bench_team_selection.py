@@ -0,0 +1,48 @@
+"""
+Benchmark of select_team's branch and bound against enumerating every C(n, 5) team, on synthetic rosters where a
+third of the gymnasts are specialists without a score on some apparatus. Run from the repository root:
+
+    python -m benchmarks.bench_team_selection --sizes 15 25 40 80
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from myProject.team import best_team, team_score
+
+
+def synthetic_roster(n, rng):
+    scores = np.round(rng.normal(13, 1, (n, 4)), 3)
+    scores[rng.random((n, 4)) < 0.3] = 0 #specialists
+    return scores
+
+
+def brute_force(scores, team_size=5, count=3):
+    return max(team_score(scores, team, count) for team in itertools.combinations(range(len(scores)), team_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[15, 25, 40, 80], help='roster sizes')
+    parser.add_argument('--brute-max', type=int, default=30, help='largest roster also solved by enumeration')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n in args.sizes:
+        scores = synthetic_roster(n, rng)
+        start = time.perf_counter()
+        _, score, explored = best_team(scores)
+        elapsed = time.perf_counter() - start
+        line = f'{n:4d} gymnasts  branch and bound: {elapsed * 1e3:8.1f} ms, {explored:7d} partial teams'
+        if n <= args.brute_max:
+            start = time.perf_counter()
+            expected = brute_force(scores)
+            line += f'   enumeration of C(n, 5) teams: {(time.perf_counter() - start) * 1e3:9.1f} ms, same score: {abs(expected - score) < 1e-9}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
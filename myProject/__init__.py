@@ -1,7 +1,45 @@
-from .simulations import add_user_entry, delete_recent_entry, monte_carlo, medal_count_by_country
+import importlib
 
-from .sqlPlots import data_cleaning, difficultyVsExecutionPlot, query_gym_country_database, scatterplot_of_country, query_pivoted_database
+# public names and the submodule that defines them, the submodule is only imported when a name is first used
+_EXPORTS = {
+    'add_user_entry': 'simulations',
+    'delete_recent_entry': 'simulations',
+    'monte_carlo': 'simulations',
+    'medal_count_by_country': 'simulations',
+    'build_baseline': 'simulations',
+    'what_if': 'simulations',
+    'medal_simulation': 'simulations',
+    'simulate_team_final': 'simulations',
+    'simulate_all_around': 'simulations',
+    'country_medal_probabilities': 'simulations',
+    'adaptive_monte_carlo': 'simulations',
+    'data_cleaning': 'sqlPlots',
+    'difficultyVsExecutionPlot': 'sqlPlots',
+    'query_gym_country_database': 'sqlPlots',
+    'scatterplot_of_country': 'sqlPlots',
+    'query_pivoted_database': 'sqlPlots',
+    'scatterplot_by_country': 'visualizations',
+    'boxplot_by_country': 'visualizations',
+    'box_summary': 'visualizations',
+    'select_team': 'team',
+    'get_results': 'data',
+    'load_results': 'data',
+}
 
-# from .visualizations import scatterplot_by_country
+_SUBMODULES = {'app', 'data', 'db', 'ingest', 'jobs', 'model', 'schema', 'simulations', 'sqlPlots', 'team', 'visualizations'}
 
-# from .app import DashApp
\ No newline at end of file
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+        globals()[name] = value #later lookups skip __getattr__
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | _SUBMODULES)
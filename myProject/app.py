@@ -1,26 +1,42 @@
+from functools import lru_cache
+
 import dash
 from dash import dcc, html
 import pandas as pd
 import plotly.express as px
 from dash import Dash, dcc, html, Input, Output, State, callback
 # Import the function from visualizations.py
-from visualizations import scatterplot_by_country
-from sqlPlots import query_pivoted_database
-from simulations import add_user_entry
-from simulations import monte_carlo
-from simulations import medal_count_by_country
-
-def DashApp():
+try:
+    from .visualizations import boxplot_by_country, scatterplot_by_country
+    from .simulations import medal_simulation
+    from .jobs import JobManager
+    from .simulations import medal_count_by_country
+    from .data import dataset_version, get_dataset, get_results
+    from .sqlPlots import database_version, latest_model_version
+except ImportError: #run as a script from inside myProject
+    from visualizations import boxplot_by_country, scatterplot_by_country
+    from simulations import medal_simulation
+    from jobs import JobManager
+    from simulations import medal_count_by_country
+    from data import dataset_version, get_dataset, get_results
+    from sqlPlots import database_version, latest_model_version
+
+FIGURE_CACHE_SIZE = 512  # serialized country figures kept in memory, two plot types per country
+
+def DashApp(warm_cache=False, job_store='jobs.sqlite'):
     '''
     Dash App to show visualizations of gymnastics
     
     First one is the option for either a scatterplot or a box plot
     
     Second one is user submission to enter a hypothetical athelete, and to see their medal count within their country
+
+    warm_cache pre-renders the plots of every country at startup, the hit/miss counters of the figure cache are served at /figure-cache
+
+    job_store is the SQLite file where the medal simulations run in the background keep their progress and results
     '''
     # Load dataset to get the list of unique countries
-    df = pd.read_csv("data_2022_2023.csv")
-    df['Country'] = df['Country'].str.strip().str.upper()  # Normalize country names
+    df = get_results("data_2022_2023.csv", columns=['Country', 'Apparatus', 'Score'])  # Country names are already normalized by the cache
 
     # Initialize Dash app
     app = dash.Dash(__name__)
@@ -89,6 +105,17 @@ def DashApp():
             id='UB_PredictedScore',
             style={'width': 500, 'height': 20},
         ),
+        html.P("Predict the other gymnasts' scores from: "),
+        dcc.RadioItems(
+            id='mean-model',
+            options=[
+                {"label": "Average score", "value": "average"},
+                {"label": "Score model (run python -m myProject.model first)", "value": "model"},
+                {"label": "Recent form", "value": "form"}
+            ],
+            value="average",
+            inline=True
+        ),
         html.Button('Submit', id='submit-button', n_clicks=0,  #keeping track of when the user clicked on the button
                         style={ 
             'backgroundColor': '#643843', #changing background color to dark pink
@@ -96,10 +123,34 @@ def DashApp():
             'padding': '10px 20px', #padding for better design
             'borderRadius': '5px', #more rounded edges
         }),
+        html.Button('Cancel', id='cancel-button', n_clicks=0, style={'marginLeft': 10, 'padding': '10px 20px', 'borderRadius': '5px'}),
+        html.Div([
+            html.Progress(id='medals-progress', value='0', max='100', style={'width': 500}),
+            html.Span(id='medals-status', style={'marginLeft': 10}),
+        ], style={'marginTop': 10}),
+        dcc.Store(id='medals-job'), #key and country of the running simulation
+        dcc.Interval(id='medals-poll', interval=500, disabled=True), #polls the job while it runs
         html.Div(id='textarea-output', style={'whiteSpace': 'pre-line', 'margin': 40, 'border': 50}), #margin for more white space
         dcc.Graph(id='medals-plot')  # This graph updates based on the dropdown & toggle
     ], style={'whiteSpace': 'pre-line', 'margin': 40, 'border': 50})
 
+    def build_country_plot(selected_country, plot_type):
+        filtered_data = get_dataset("data_2022_2023.csv", columns=['LastName', 'Score']).country(selected_country)  # pre-built row range, no scan of the whole dataset
+
+        if filtered_data.empty:
+            return px.scatter(title=f"No Data Available for {selected_country}")
+
+        if plot_type == "scatter":
+            return scatterplot_by_country(selected_country, filtered_data)  # Calls scatter function
+        else:
+            # Quartiles, whiskers and outliers are computed server-side, only those are sent to the browser
+            return boxplot_by_country(selected_country, filtered_data)
+    # The same inputs always give the same figure, so serialized figures are kept in a bounded LRU cache.
+    # The dataset version is part of the key, figures of an older CSV are never served and age out of the cache
+    @lru_cache(maxsize=FIGURE_CACHE_SIZE)
+    def render_country_plot(selected_country, plot_type, data_version):
+        return build_country_plot(selected_country, plot_type).to_dict()
+
     # Callback to update the plot based on user selection
     @app.callback(
         dash.Output('country-plot', 'figure'),
@@ -107,57 +158,52 @@ def DashApp():
         dash.Input('plot-type', 'value')]
     )
     def update_plot(selected_country, plot_type):
-        filtered_data = df[df['Country'] == selected_country]
-
-        if filtered_data.empty:
-            return px.scatter(title=f"No Data Available for {selected_country}")
+        return render_country_plot(selected_country, plot_type, dataset_version("data_2022_2023.csv"))
+
+    # Cache hit/miss counters
+    @app.server.route('/figure-cache')
+    def figure_cache_stats():
+        return dict(render_country_plot.cache_info()._asdict(), data_version=dataset_version("data_2022_2023.csv"))
+
+    if warm_cache:
+        # Pre-render every country so the first view of each one is served from the cache
+        data_version = dataset_version("data_2022_2023.csv")
+        for country in df['Country'].unique():
+            for plot_type in ["scatter", "box"]:
+                render_country_plot(country, plot_type, data_version)
+
+    # The simulation runs as a background job, the callback only submits it and then polls its progress,
+    # so a slow simulation never holds a server worker and identical submissions share one job
+    jobs = JobManager(job_store)
+
+    def job_display(key, country):
+        state = jobs.status(key)
+        if state is None:
+            return px.scatter(title="The simulation was lost, please submit again."), None, True, '0', ''
+        progress = str(round(100 * state['progress']))
+        if state['status'] == 'done':
+            result = jobs.result(key)
+            if result is None: #evicted from the job store since the status was read
+                return px.scatter(title="The simulation was lost, please submit again."), None, True, '0', ''
+            return medal_count_by_country(result, country), None, True, '100', 'Done'  # Calls medal count by country
+        if state['status'] == 'failed':
+            return px.scatter(title=f"The simulation failed: {state['error']}"), None, True, progress, 'Failed'
+        if state['status'] == 'cancelled':
+            return px.scatter(title="The simulation was cancelled."), None, True, progress, 'Cancelled'
+        return dash.no_update, {'key': key, 'country': country}, False, progress, f"Simulating... {progress}%"
 
-        if plot_type == "scatter":
-            return scatterplot_by_country(selected_country)  # Calls scatter function
-        else:
-            # Restore the original Box Plot
-            fig = px.box(
-                filtered_data, 
-                x="Apparatus",
-                y="Score", 
-                color="Apparatus",
-                title=f"Gymnastics Score Distribution for {selected_country}",
-                labels={"Apparatus": "Event", "Score": "Final Score"},
-                points="all"  # Show all points (outliers included)
-            )
-
-            # Layout adjustments for spacing & readability
-            fig.update_layout(
-                xaxis={'tickangle': -45},  # Rotate event labels for better spacing
-                xaxis_title="Event",
-                yaxis_title="Final Score",
-                margin=dict(l=40, r=40, t=60, b=120)
-            )
-
-            # Restore annotation box for explaining Box Plot
-            fig.add_annotation(
-                x=0.5, y=-0.2,
-                text="🔹 Box represents the middle 50% of scores (Q1 to Q3).<br>"
-                    "🔹 Line inside the box = Median (middle score).<br>"
-                    "🔹 Whiskers extend to non-outlier min/max scores.<br>"
-                    "🔹 Dots outside whiskers = Outliers (exceptionally high/low scores).",
-                showarrow=False,
-                xref="paper", yref="paper",
-                font=dict(size=14, color="black"),
-                align="center",
-                bordercolor="black",
-                borderwidth=2,
-                bgcolor="white",
-                opacity=0.95
-            )
-
-            return fig
     @app.callback(
         # dash.Output('textarea-output', 'children'),
         Output('medals-plot', 'figure'),
+        Output('medals-job', 'data'),
+        Output('medals-poll', 'disabled'),
+        Output('medals-progress', 'value'),
+        Output('medals-status', 'children'),
         
         # dash.Input('country-dropdown', 'value'),
         Input('submit-button', 'n_clicks'), 
+        Input('medals-poll', 'n_intervals'),
+        Input('cancel-button', 'n_clicks'),
         State('FirstName', 'value'), 
         State('LastName', 'value'), 
         State('Country', 'value'), 
@@ -165,14 +211,27 @@ def DashApp():
         State('VT_PredictedScore', 'value') ,
         State('FX_PredictedScore', 'value') ,
         State('UB_PredictedScore', 'value') ,
+        State('mean-model', 'value'),
+        State('medals-job', 'data'),
     )
 
-    def update_medals_plot(n_clicks, FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore):
+    def update_medals_plot(n_clicks, n_intervals, cancel_clicks, FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore, mean_model, job):
+        trigger = dash.ctx.triggered_id
+        if trigger == 'medals-poll':
+            if job:
+                return job_display(job['key'], job['country'])
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update #a poll never submits, or it could restart a cancelled job
+        if trigger == 'cancel-button':
+            if job:
+                jobs.cancel(job['key'])
+                return job_display(job['key'], job['country'])
+            return dash.no_update, None, True, dash.no_update, dash.no_update
+
         if n_clicks == 0:
-            return px.scatter(title="No Data Available Yet- Please fill in Athlete's Details")
+            return px.scatter(title="No Data Available Yet- Please fill in Athlete's Details"), None, True, '0', ''
         
         if None in [FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore]:
-            return px.scatter(title="Please fill in all fields.")
+            return px.scatter(title="Please fill in all fields."), None, True, '0', ''
 
 
         if n_clicks > 0:
@@ -182,13 +241,15 @@ def DashApp():
             UB_PredictedScore = float(UB_PredictedScore) if UB_PredictedScore else 0.0
 
             # return(f' FirstName"{FirstName}" LastName"{LastName}"  Country"{Country}"  BB_PredictedScore"{BB_PredictedScore}"  VT_PredictedScore"{VT_PredictedScore}"  FX_PredictedScore"{FX_PredictedScore}" UB_PredictedScore"{UB_PredictedScore}" ') 
-            pivoted_database = query_pivoted_database()
-            new_pivoted_database = add_user_entry(pivoted_database,FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore)
-            medal_pivoted_database = monte_carlo(pivoted_database)
-            return medal_count_by_country(medal_pivoted_database, Country)  # Calls medal count by country
+            # the field is simulated once per worker and cached, only the new athlete is simulated per submit
+            model_version = latest_model_version() if mean_model == 'model' else None  # a retrained model gives a new job too
+            key = jobs.submit(medal_simulation, FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore, data_version=database_version(), mean_model=mean_model, model_version=model_version)  # new results loaded by myProject.ingest give a new job
+            return job_display(key, Country)
         
 
 
-    if __name__ == '__main__':
-        app.run_server(debug=True)
-DashApp()
\ No newline at end of file
+    return app
+
+
+if __name__ == '__main__':
+    DashApp().run_server(debug=True)
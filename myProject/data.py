@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CSV = 'data_2022_2023.csv'
+
+REQUIRED_COLUMNS = ['LastName', 'FirstName', 'Gender', 'Country', 'Date', 'Competition', 'Round', 'Location', 'Apparatus', 'Rank', 'D_Score', 'E_Score', 'Penalty', 'Score']
+NUMERIC_COLUMNS = ['Rank', 'D_Score', 'E_Score', 'Penalty', 'Score']
+CATEGORICAL_COLUMNS = ['Country', 'Apparatus', 'Round', 'Competition']
+
+# apparatus of every discipline in Olympic order, keyed by the dataset's Gender code
+DISCIPLINES = {
+    'w': ['VT', 'UB', 'BB', 'FX'],
+    'm': ['FX', 'PH', 'SR', 'VT', 'PB', 'HB'],
+}
+
+
+def event_key(gender, apparatus):
+    """
+    This function names an event of the pivoted database: women's events keep the bare apparatus of the original BB/VT/FX/UB columns, men's are prefixed, e.g. 'm_FX'
+
+    Args:
+        gender: key of DISCIPLINES
+        apparatus
+
+    Returns:
+        str
+    """
+    return apparatus if gender == 'w' else f'{gender}_{apparatus}'
+
+
+def discipline_events(gender):
+    """
+    This function lists the event keys of one discipline
+
+    Args:
+        gender: key of DISCIPLINES
+
+    Returns:
+        list of str
+    """
+    return [event_key(gender, apparatus) for apparatus in DISCIPLINES[gender]]
+
+
+EVENTS = [event for gender in DISCIPLINES for event in discipline_events(gender)] #every event of every discipline
+
+MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+
+def _parse_date_part(text):
+    """
+    This function reads the day, month and year that are present in one side of a date range such as '29 Jul' or '2 Aug 2022'
+
+    Args:
+        text
+
+    Returns:
+        (day, month, year), each None when missing
+    """
+    day = month = year = None
+    for token in re.findall(r'[A-Za-z]+|\d+', text):
+        if token.isdigit():
+            if len(token) == 4:
+                year = int(token)
+            else:
+                day = int(token)
+        elif token[:3].lower() in MONTHS:
+            month = MONTHS[token[:3].lower()]
+    return day, month, year
+
+
+def parse_date_range(text):
+    """
+    This function parses the free-text competition dates of the dataset, such as '24-27 Feb 2022', '29 Jul-2 Aug 2022', '30 Sept 2022 - 2 Oct 2022' or 'SUN 25 JUL 2021'
+
+    Args:
+        text
+
+    Returns:
+        (start, end) pandas Timestamps, NaT when the text cannot be parsed
+    """
+    if not isinstance(text, str):
+        return pd.NaT, pd.NaT
+    start_text, _, end_text = text.partition('-')
+    end_day, end_month, end_year = _parse_date_part(end_text or start_text)
+    start_day, start_month, start_year = _parse_date_part(start_text)
+    if None in (start_day, end_day, end_month, end_year):
+        return pd.NaT, pd.NaT
+    start_month = start_month or end_month
+    start_year = start_year or end_year
+    try:
+        return pd.Timestamp(start_year, start_month, start_day), pd.Timestamp(end_year, end_month, end_day)
+    except ValueError:
+        return pd.NaT, pd.NaT
+
+
+def parse_dates(dates):
+    """
+    This function parses a column of free-text dates once per distinct value
+
+    Args:
+        dates: series of date strings
+
+    Returns:
+        (start, end) datetime series aligned with dates
+    """
+    parsed = {text: parse_date_range(text) for text in pd.unique(dates)}
+    start = pd.to_datetime(dates.map(lambda text: parsed[text][0]))
+    end = pd.to_datetime(dates.map(lambda text: parsed[text][1]))
+    return start, end
+
+
+def read_results_csv(path=DEFAULT_CSV):
+    """
+    This function parses a results CSV into typed columns: trimmed upper-case countries, categorical Country/Apparatus/Round/Competition, numeric scores and parsed StartDate/EndDate
+
+    Args:
+        path: path of the CSV
+
+    Returns:
+        dataframe
+    """
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f'{path} is missing the columns {missing}')
+
+    df['Country'] = df['Country'].str.strip().str.upper() #normalize country names
+    for column in NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype('category')
+    df['StartDate'], df['EndDate'] = parse_dates(df['Date'])
+    return df
+
+
+def _feather():
+    """
+    This function imports pyarrow's Feather module on first use, so importing this module stays cheap
+
+    Returns:
+        pyarrow.feather, or None when pyarrow is not installed and every load parses the CSV
+    """
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return None
+    return feather
+
+
+def _fingerprint(path):
+    """
+    This function hashes the content of a file
+
+    Args:
+        path
+
+    Returns:
+        hex sha256
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(path=DEFAULT_CSV):
+    """
+    This function returns where the columnar cache of a CSV lives, next to the CSV
+
+    Args:
+        path: path of the CSV
+
+    Returns:
+        path of the Feather file
+    """
+    return os.path.splitext(path)[0] + '.feather'
+
+
+def ensure_cache(path=DEFAULT_CSV):
+    """
+    This function writes the Feather cache of a CSV when it is missing or stale. The cache is reused while the CSV's mtime and size are unchanged, and also after a touch that left its sha256 unchanged
+
+    Args:
+        path: path of the CSV
+
+    Returns:
+        (path of the Feather file, sha256 of the CSV)
+    """
+    target = cache_path(path)
+    meta_path = target + '.json'
+    stat = os.stat(path)
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        meta = {}
+
+    if os.path.exists(target) and meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return target, meta['sha256']
+
+    sha256 = _fingerprint(path)
+    if not (os.path.exists(target) and meta.get('sha256') == sha256):
+        tmp = target + '.tmp'
+        _feather().write_feather(read_results_csv(path), tmp, compression='uncompressed') #uncompressed so it can be memory-mapped
+        os.replace(tmp, target)
+
+    meta = {'sha256': sha256, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    with open(meta_path + '.tmp', 'w') as file:
+        json.dump(meta, file)
+    os.replace(meta_path + '.tmp', meta_path)
+    return target, sha256
+
+
+def dataset_version(path=DEFAULT_CSV):
+    """
+    This function returns a stamp that changes whenever the content of the CSV changes, for keying caches of anything derived from it
+
+    Args:
+        path: path of the CSV
+
+    Returns:
+        str
+    """
+    if _feather() is None:
+        stat = os.stat(path)
+        return f'{stat.st_mtime_ns}-{stat.st_size}'
+    return ensure_cache(path)[1]
+
+
+def load_results(path=DEFAULT_CSV, columns=None):
+    """
+    This function loads the results dataset through its memory-mapped Feather cache, rebuilding the cache first if the CSV changed.
+    Without pyarrow it falls back to parsing the CSV
+
+    Args:
+        path: path of the CSV
+        columns: optional list of columns to load
+
+    Returns:
+        dataframe
+    """
+    feather = _feather()
+    if feather is None:
+        df = read_results_csv(path)
+        return df[columns] if columns is not None else df
+    target, _ = ensure_cache(path)
+    return feather.read_table(target, columns=columns, memory_map=True).to_pandas()
+
+
+@lru_cache(maxsize=8)
+def _cached_results(path, mtime_ns, columns):
+    return load_results(path, list(columns) if columns is not None else None)
+
+
+def get_results(path=DEFAULT_CSV, columns=None):
+    """
+    This function is the shared accessor of the results dataset: it is loaded on first use and reused until the CSV changes.
+    The dataframe is shared between callers, so copy it before modifying it
+
+    Args:
+        path: path of the CSV
+        columns: optional list of columns to load
+
+    Returns:
+        dataframe
+    """
+    path = os.path.abspath(path)
+    return _cached_results(path, os.stat(path).st_mtime_ns, tuple(columns) if columns is not None else None)
+
+
+class ResultsDataset:
+    """
+    Results sorted by Country and Apparatus, with the row range of every country and of every country × apparatus built once at load time.
+    Selecting a country is then a zero-copy iloc slice whose cost does not depend on the size of the dataset
+    """
+
+    def __init__(self, df, version=None):
+        self.df = df.sort_values(['Country', 'Apparatus'], kind='stable').reset_index(drop=True)
+        self.version = version
+        self._countries = self._ranges(self.df['Country'].astype(str).to_numpy())
+        self._events = self._ranges(self.df['Country'].astype(str).to_numpy() + '\x1f' + self.df['Apparatus'].astype(str).to_numpy())
+
+    @staticmethod
+    def _ranges(keys):
+        """
+        This function finds the (start, stop) rows of every run of equal keys in a sorted array
+
+        Args:
+            keys: sorted 1-D array
+
+        Returns:
+            dict of key to (start, stop)
+        """
+        if len(keys) == 0:
+            return {}
+        starts = np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+        stops = np.append(starts[1:], len(keys))
+        return {keys[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    def countries(self):
+        """
+        This function lists the countries of the dataset
+
+        Returns:
+            list of str
+        """
+        return list(self._countries)
+
+    def country(self, country, apparatus=None):
+        """
+        This function returns the results of one country, optionally of one apparatus only
+
+        Args:
+            country
+            apparatus: optional apparatus
+
+        Returns:
+            dataframe, a view of the dataset's rows that must not be modified
+        """
+        key = country if apparatus is None else f'{country}\x1f{apparatus}'
+        start, stop = (self._countries if apparatus is None else self._events).get(key, (0, 0))
+        return self.df.iloc[start:stop]
+
+
+@lru_cache(maxsize=8)
+def _cached_dataset(path, mtime_ns, columns):
+    return ResultsDataset(get_results(path, columns), version=dataset_version(path))
+
+
+def get_dataset(path=DEFAULT_CSV, columns=None):
+    """
+    This function is the shared accessor of the indexed results dataset: it is built on first use and reused until the CSV changes
+
+    Args:
+        path: path of the CSV
+        columns: optional list of columns to load, Country and Apparatus are always included
+
+    Returns:
+        ResultsDataset
+    """
+    if columns is not None:
+        columns = ['Country', 'Apparatus'] + [column for column in columns if column not in ('Country', 'Apparatus')]
+    path = os.path.abspath(path)
+    return _cached_dataset(path, os.stat(path).st_mtime_ns, tuple(columns) if columns is not None else None)
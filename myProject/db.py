@@ -0,0 +1,219 @@
+import math
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    from .data import parse_date_range
+except ImportError: #imported as a top-level module by app.py
+    from data import parse_date_range
+
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024 #bytes of the database file mapped into memory per connection
+STATEMENT_CACHE_SIZE = 128 #prepared statements kept per connection
+DEFAULT_POOL_SIZE = 8 #read-only connections open at most per database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class SumSquaredDeviations:
+    """
+    SQLite aggregate that keeps Welford's running mean and sum of squared deviations, so the spread of scores around 14-15 is computed in one pass without the cancellation of AVG(x*x) - AVG(x)*AVG(x)
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        return self.m2 if self.n else None
+
+
+class StdDevPop(SumSquaredDeviations):
+    """
+    SQLite aggregate for the population standard deviation, built on the same one-pass update
+    """
+
+    def finalize(self):
+        return math.sqrt(self.m2 / self.n) if self.n else None
+
+
+def date_range_start(text):
+    """
+    This function parses the first day of a free-text competition date such as '24-27 Feb 2022'
+
+    Args:
+        text
+
+    Returns:
+        ISO 8601 date, None when the text cannot be parsed
+    """
+    start = parse_date_range(text)[0]
+    return None if pd.isna(start) else start.date().isoformat()
+
+
+def date_range_end(text):
+    """
+    This function parses the last day of a free-text competition date such as '24-27 Feb 2022'
+
+    Args:
+        text
+
+    Returns:
+        ISO 8601 date, None when the text cannot be parsed
+    """
+    end = parse_date_range(text)[1]
+    return None if pd.isna(end) else end.date().isoformat()
+
+
+def register_functions(conn):
+    """
+    This function registers the user-defined functions every connection of the project can use in SQL: the aggregates stddev_pop(x) and sum_sq_dev(x),
+    and date_range_start(text) and date_range_end(text), which schema.fill_competition_dates uses to fill the competitions table
+
+    Args:
+        conn: sqlite3 connection
+
+    Returns:
+        None
+    """
+    conn.create_aggregate('stddev_pop', 1, StdDevPop)
+    conn.create_aggregate('sum_sq_dev', 1, SumSquaredDeviations)
+    conn.create_function('date_range_start', 1, date_range_start, deterministic=True)
+    conn.create_function('date_range_end', 1, date_range_end, deterministic=True)
+
+
+@contextmanager
+def write_connection(database='gym', wal=False):
+    """
+    This function opens a writable connection, commits when the block succeeds, rolls back when it fails and always closes the connection
+
+    Args:
+        database: path of the SQLite database
+        wal: switch the file to WAL mode first, so readers never block on the writer and the writer never blocks readers. The mode is stored in the file and creates -wal and -shm files next to it
+
+    Returns:
+        sqlite3 connection, as a context manager
+    """
+    conn = sqlite3.connect(database, cached_statements=STATEMENT_CACHE_SIZE)
+    register_functions(conn)
+    try:
+        if wal:
+            conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most size read-only SQLite connections. A query checks a connection out and back in, so Dash worker threads,
+    which can be a new thread for every request, never share a connection or pay for opening one per request
+    """
+
+    def __init__(self, database='gym', mmap_size=DEFAULT_MMAP_SIZE, size=DEFAULT_POOL_SIZE, check=None):
+        self.database = os.path.abspath(database)
+        self.mmap_size = mmap_size
+        self._idle = queue.LifoQueue() #the most recently used connection has the warmest caches
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = []
+        if check is not None:
+            try:
+                with self.connection() as conn:
+                    check(conn)
+            except Exception:
+                self.close()
+                raise
+
+    def _open(self):
+        conn = sqlite3.connect(f'file:{self.database}?mode=ro', uri=True, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        register_functions(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        This function checks a read-only connection out of the pool, opening one when none is idle, and waits while size connections are in use
+
+        Returns:
+            sqlite3 connection, as a context manager that returns it to the pool
+        """
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+
+    def query(self, sql, params=()):
+        """
+        This function runs a query with bound parameters on a pooled connection
+
+        Args:
+            sql: query with ? placeholders
+            params: values bound to the placeholders
+
+        Returns:
+            dataframe
+        """
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def close(self):
+        """
+        This function closes every connection opened by the pool
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._idle = queue.LifoQueue()
+
+
+def get_pool(database='gym', check=None):
+    """
+    This function returns the shared connection pool of a database and creates it on first use. The pool only reads, it never changes the file
+
+    Args:
+        database: path of the SQLite database
+        check: function called once with a read-only connection when the pool is created, raising when the database cannot be read, for example schema.check_schema
+
+    Returns:
+        ConnectionPool
+    """
+    path = os.path.abspath(database)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path, check=check)
+        return _pools[path]
+
+
+def close_pools():
+    """
+    This function closes every pool, for example after the database file was replaced
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
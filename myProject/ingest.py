@@ -0,0 +1,151 @@
+"""
+Streams results CSV files into the gym database: every chunk is cleaned with sqlPlots.data_cleaning, rows already in the
+database are skipped and the rest are inserted through the gym view, whose triggers keep the normalized tables and the
+athlete_apparatus_stats summary up to date. Memory is bounded by the chunk size. Run from the repository root:
+
+    python -m myProject.ingest data_2024.csv --database gym
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+try:
+    from .data import NUMERIC_COLUMNS, REQUIRED_COLUMNS, parse_dates
+    from .db import write_connection
+    from .schema import ensure_schema
+    from .simulations import clear_baselines
+    from .sqlPlots import data_cleaning
+except ImportError: #imported as a top-level module by app.py
+    from data import NUMERIC_COLUMNS, REQUIRED_COLUMNS, parse_dates
+    from db import write_connection
+    from schema import ensure_schema
+    from simulations import clear_baselines
+    from sqlPlots import data_cleaning
+
+DEFAULT_CHUNK_SIZE = 50_000 #rows read, cleaned and committed at a time
+
+# a result is identified by all of its values: once VT1 and VT2 are both stored as VT, the two vaults of a routine only differ by their scores
+NATURAL_KEY = ['LastName', 'FirstName', 'Gender', 'Country', 'Date', 'Competition', 'Round', 'Location', 'Apparatus', 'Rank', 'D_Score', 'E_Score', 'Penalty', 'Score']
+
+STAGING_TABLE = f'''
+CREATE TEMP TABLE IF NOT EXISTS gym_staging ({', '.join(NATURAL_KEY)}, StartDate, EndDate)
+'''
+
+# the competitions are added with the dates parsed in Python, so the gym triggers never need a Python function
+INSERT_NEW_COMPETITIONS = '''
+INSERT OR IGNORE INTO competitions (Competition, Location, Date, StartDate, EndDate)
+SELECT DISTINCT Competition, Location, Date, StartDate, EndDate FROM gym_staging
+'''
+
+# NULL-safe comparison of every column, so rows with a missing Rank or Penalty are recognized too
+INSERT_NEW_ROWS = f'''
+INSERT INTO gym ({', '.join(NATURAL_KEY)})
+SELECT {', '.join(NATURAL_KEY)} FROM gym_staging AS s
+WHERE NOT EXISTS (
+    SELECT 1 FROM gym AS g
+    WHERE {' AND '.join(f'g.{column} IS s.{column}' for column in NATURAL_KEY)}
+)
+'''
+
+
+def clean_chunk(chunk):
+    """
+    This function applies the cleaning rules of the dataset to one chunk of a CSV and drops the rows repeated within the chunk
+
+    Args:
+        chunk: dataframe read from the CSV
+
+    Returns:
+        dataframe with the NATURAL_KEY columns
+    """
+    chunk.columns = chunk.columns.str.strip()
+    missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ValueError(f'the CSV is missing the columns {missing}')
+    for column in NUMERIC_COLUMNS:
+        chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+    chunk = data_cleaning(chunk)
+    return chunk[NATURAL_KEY].drop_duplicates()
+
+
+def _sql_value(value):
+    return None if pd.isna(value) else value
+
+
+def ingest_csv(path, database='gym', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    This function streams one CSV into the database, committing one transaction per chunk
+
+    Args:
+        path: path of the CSV
+        database: path of the SQLite database
+        chunk_size: number of CSV rows per chunk
+
+    Returns:
+        dict with the number of rows read, kept after cleaning and inserted
+    """
+    counts = {'read': 0, 'cleaned': 0, 'inserted': 0}
+    with write_connection(database, wal=True) as conn: #loading is the explicit step that switches the database to WAL
+        ensure_schema(conn)
+        conn.execute(STAGING_TABLE)
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            counts['read'] += len(chunk)
+            chunk = clean_chunk(chunk)
+            counts['cleaned'] += len(chunk)
+
+            start, end = parse_dates(chunk['Date'])
+            chunk = chunk.assign(StartDate=start.dt.strftime('%Y-%m-%d'), EndDate=end.dt.strftime('%Y-%m-%d'))
+
+            conn.execute('DELETE FROM gym_staging')
+            conn.executemany(
+                f"INSERT INTO gym_staging VALUES ({', '.join('?' * (len(NATURAL_KEY) + 2))})",
+                ([_sql_value(value) for value in row] for row in chunk.itertuples(index=False, name=None)),
+            )
+            before = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            conn.execute(INSERT_NEW_COMPETITIONS)
+            conn.execute(INSERT_NEW_ROWS)
+            counts['inserted'] += conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] - before
+            conn.commit() #one transaction per chunk
+
+        conn.execute('INSERT INTO ingests (source, rows) VALUES (?, ?)', (os.path.abspath(path), counts['inserted']))
+        conn.execute('PRAGMA optimize')
+    return counts
+
+
+def ingest(paths, database='gym', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    This function loads several CSV files in order and drops the simulation baselines cached by this process, so they are rebuilt from the new data
+
+    Args:
+        paths: list of CSV paths
+        database: path of the SQLite database
+        chunk_size: number of CSV rows per chunk
+
+    Returns:
+        dict of path to the counts of ingest_csv
+    """
+    results = {}
+    for path in paths:
+        results[path] = ingest_csv(path, database, chunk_size)
+    clear_baselines()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='results CSV files with the columns of data_2022_2023.csv')
+    parser.add_argument('--database', default='gym', help='SQLite database to load into')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE, help='CSV rows read and committed at a time')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        start = time.perf_counter()
+        counts = ingest_csv(path, args.database, args.chunksize)
+        print(f"{path}: {counts['read']} rows read, {counts['cleaned']} kept after cleaning, "
+              f"{counts['inserted']} inserted, {counts['cleaned'] - counts['inserted']} already loaded ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
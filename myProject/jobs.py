@@ -0,0 +1,282 @@
+import hashlib
+import json
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+try:
+    from .db import write_connection
+except ImportError: #imported as a top-level module by app.py
+    from db import write_connection
+
+DEFAULT_STORE = 'jobs.sqlite'
+PROGRESS_INTERVAL = 0.25 #seconds between two progress writes of a running job
+MAX_FINISHED_JOBS = 32 #finished jobs kept in the store with their results, the oldest are evicted first
+
+JOBS_TABLE = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL, --queued, running, done, failed or cancelled
+    progress REAL NOT NULL DEFAULT 0,
+    result BLOB,
+    error TEXT,
+    updated REAL NOT NULL
+)
+'''
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job when its cancellation was requested
+    """
+
+
+class JobStore:
+    """
+    Disk-backed state and results of background jobs, in a SQLite file shared by the web server and the worker processes
+    """
+
+    def __init__(self, path=DEFAULT_STORE, max_finished=MAX_FINISHED_JOBS):
+        self.path = path
+        self.max_finished = max_finished
+        with write_connection(path, wal=True) as conn: #the web server and the workers write the store concurrently
+            conn.execute(JOBS_TABLE)
+
+    def get(self, key):
+        """
+        This function reads the state of a job
+
+        Args:
+            key
+
+        Returns:
+            dict with status, progress and error, None when the job is unknown
+        """
+        with write_connection(self.path) as conn:
+            row = conn.execute('SELECT status, progress, error FROM jobs WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return {'key': key, 'status': row[0], 'progress': row[1], 'error': row[2]}
+
+    def result(self, key):
+        """
+        This function reads the result of a finished job
+
+        Args:
+            key
+
+        Returns:
+            the value returned by the job, None when it is not done
+        """
+        with write_connection(self.path) as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE key = ? AND status = 'done'", (key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def queue(self, key):
+        """
+        This function records a job as queued, resetting a failed, cancelled or stale run of the same key
+
+        Args:
+            key
+        """
+        with write_connection(self.path) as conn:
+            conn.execute('''
+                INSERT INTO jobs (key, status, progress, result, error, updated) VALUES (?, 'queued', 0, NULL, NULL, ?)
+                ON CONFLICT (key) DO UPDATE SET status = 'queued', progress = 0, result = NULL, error = NULL, updated = excluded.updated
+            ''', (key, time.time()))
+
+    def update(self, key, status, progress=None, result=None, error=None, only_from=('queued', 'running')):
+        """
+        This function moves a job to a new state, unless it already left the states in only_from, so a job cancelled meanwhile stays cancelled
+
+        Args:
+            key
+            status: new status
+            progress: new progress, unchanged when None
+            result: value to store with a 'done' status
+            error: message to store with a 'failed' status
+            only_from: states the job can be moved from
+
+        Returns:
+            True when the job was updated
+        """
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL) if status == 'done' else None
+        placeholders = ', '.join('?' * len(only_from))
+        with write_connection(self.path) as conn:
+            cursor = conn.execute(f'''
+                UPDATE jobs SET status = ?, progress = COALESCE(?, progress), result = ?, error = ?, updated = ?
+                WHERE key = ? AND status IN ({placeholders})
+            ''', (status, progress, blob, error, time.time(), key, *only_from))
+            if status not in ('queued', 'running'):
+                self._evict(conn)
+        return cursor.rowcount > 0
+
+    def _evict(self, conn):
+        # keeps the max_finished most recently finished jobs, a result evicted before it was read is simulated again on the next submit
+        conn.execute('''
+            DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND key NOT IN (
+                SELECT key FROM jobs WHERE status NOT IN ('queued', 'running') ORDER BY updated DESC LIMIT ?
+            )
+        ''', (self.max_finished,))
+
+    def clear(self):
+        """
+        This function forgets every finished job and cached result, for when the data the jobs read has changed
+        """
+        with write_connection(self.path) as conn:
+            conn.execute("DELETE FROM jobs WHERE status NOT IN ('queued', 'running')")
+
+
+def job_key(fn, args, kwargs=None):
+    """
+    This function derives the key of a job from its function and inputs, identical submissions get the same key
+
+    Args:
+        fn: module-level function
+        args: positional arguments
+        kwargs: keyword arguments
+
+    Returns:
+        hex sha256
+    """
+    payload = json.dumps([fn.__module__, fn.__qualname__, list(args), kwargs or {}], sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _run_job(store_path, key, fn, args, kwargs):
+    """
+    This function runs one job in a worker process, reporting its progress and result to the store.
+    The job is stopped at its next progress report once its cancellation is requested
+    """
+    store = JobStore(store_path)
+    if not store.update(key, 'running', progress=0.0, only_from=('queued',)):
+        return #cancelled before it started
+
+    last_write = [0.0]
+
+    def progress(fraction):
+        now = time.monotonic()
+        if now - last_write[0] < PROGRESS_INTERVAL and fraction < 1:
+            return
+        last_write[0] = now
+        if not store.update(key, 'running', progress=fraction, only_from=('running',)):
+            raise JobCancelled(key)
+
+    try:
+        result = fn(*args, progress=progress, **kwargs)
+    except JobCancelled:
+        return
+    except Exception as error:
+        store.update(key, 'failed', error=f'{type(error).__name__}: {error}', only_from=('running',))
+        return
+    store.update(key, 'done', progress=1.0, result=result, only_from=('running',))
+
+
+class JobManager:
+    """
+    Runs functions in a local process pool with their state and results kept in a JobStore.
+    Identical submissions share one job while it is in flight and reuse its result once it is done
+    """
+
+    def __init__(self, store_path=DEFAULT_STORE, max_workers=1):
+        self.store = JobStore(store_path)
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        This function starts fn(*args, progress=..., **kwargs) in the background, unless the same job is already running or done
+
+        Args:
+            fn: module-level function accepting a progress callable
+            args: positional arguments
+            kwargs: keyword arguments
+
+        Returns:
+            key of the job
+        """
+        key = job_key(fn, args, kwargs)
+        with self._lock:
+            state = self.store.get(key)
+            in_flight = key in self._futures and not self._futures[key].done()
+            if state is not None and (state['status'] == 'done' or (state['status'] in ('queued', 'running') and in_flight)):
+                return key
+
+            self.store.queue(key)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+            future = executor.submit(_run_job, self.store.path, key, fn, args, kwargs)
+            self._futures[key] = future
+        future.add_done_callback(partial(self._finished, key, executor)) #outside the lock, a future that is already done calls back at once
+        return key
+
+    def _finished(self, key, executor, future):
+        """
+        This function marks a job as failed when its worker could not report it, e.g. when the worker process died or ran out of memory.
+        A broken pool is dropped so the next submission starts a new one
+        """
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            return
+        self.store.update(key, 'failed', error=f'{type(error).__name__}: {error}')
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                if self._executor is executor: #not replaced yet by the callback of another job of the same pool
+                    self._executor = None
+            executor.shutdown(wait=False)
+
+    def status(self, key):
+        """
+        This function reads the state of a job
+
+        Args:
+            key
+
+        Returns:
+            dict with status, progress and error, None when the job is unknown
+        """
+        return self.store.get(key)
+
+    def result(self, key):
+        """
+        This function reads the result of a finished job
+
+        Args:
+            key
+
+        Returns:
+            the value returned by the job, None when it is not done
+        """
+        return self.store.result(key)
+
+    def cancel(self, key):
+        """
+        This function cancels a queued or running job, a running job stops at its next progress report
+
+        Args:
+            key
+
+        Returns:
+            True when the job was still queued or running
+        """
+        with self._lock:
+            future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+        return self.store.update(key, 'cancelled')
+
+    def shutdown(self):
+        """
+        This function stops the worker processes
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
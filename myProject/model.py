@@ -0,0 +1,371 @@
+"""
+The Gymnastics score network of projectPYTORCH as an importable module: the preprocessing is fitted once and saved next to the
+best checkpoint, training uses mini-batches with early stopping, and the app loads the saved model instead of retraining it.
+Train from the repository root with:
+
+    python -m myProject.model --epochs 500
+"""
+import argparse
+import hashlib
+import io
+import os
+from functools import lru_cache
+
+import joblib
+import numpy as np
+import torch
+import torch.nn as nn
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from torch.utils.data import DataLoader, TensorDataset
+
+try:
+    from .data import get_results
+    from .db import write_connection
+    from .sqlPlots import database_version, query_model_features, query_pivoted_database
+except ImportError: #imported as a top-level module by app.py
+    from data import get_results
+    from db import write_connection
+    from sqlPlots import database_version, query_model_features, query_pivoted_database
+
+MODEL_DIR = 'models'
+CHECKPOINT_FILE = 'gymnastics.pt'
+PREPROCESSOR_FILE = 'preprocessor.joblib'
+
+CATEGORICAL_FEATURES = ['Apparatus']
+NUMERIC_FEATURES = ['E_Score', 'D_Score', 'Rank']
+TARGET = 'Score'
+
+
+# creating the neural network
+class Gymnastics(nn.Module):
+    def __init__(self, input_d):
+        super(Gymnastics, self).__init__()
+        self.fc1 = nn.Linear(input_d, 64)
+        self.fc2 = nn.Linear(64, 32)
+        self.fc3 = nn.Linear(32, 1)
+
+    def forward(self, x):
+        x = torch.relu(self.fc1(x))
+        x = torch.relu(self.fc2(x))
+        return self.fc3(x)
+
+
+def training_data(path="data_2022_2023.csv"):
+    """
+    This function selects the features and the target of the network from the results dataset. Penalty is left out like in the notebook, missing ranks are imputed by the preprocessor
+
+    Args:
+        path: path of the CSV
+
+    Returns:
+        (features dataframe, target series)
+    """
+    data = get_results(path, columns=CATEGORICAL_FEATURES + NUMERIC_FEATURES + [TARGET])
+    data = data.dropna(subset=['E_Score', 'D_Score', 'Apparatus', TARGET])
+    features = data[CATEGORICAL_FEATURES + NUMERIC_FEATURES].astype({'Apparatus': str})
+    return features, data[TARGET]
+
+
+def build_preprocessor():
+    """
+    This function builds the preprocessing of the notebook: one-hot encoded apparatus and scaled scores and rank, with missing ranks filled with the average rank
+
+    Returns:
+        unfitted ColumnTransformer
+    """
+    return ColumnTransformer([
+        ('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_FEATURES),
+        ('num', make_pipeline(SimpleImputer(strategy='mean'), StandardScaler()), NUMERIC_FEATURES),
+    ], sparse_threshold=0)
+
+
+def to_tensor(preprocessor, features):
+    """
+    This function turns feature rows into the network's input
+
+    Args:
+        preprocessor: fitted ColumnTransformer
+        features: dataframe with the CATEGORICAL_FEATURES and NUMERIC_FEATURES columns
+
+    Returns:
+        float32 tensor
+    """
+    features = features[CATEGORICAL_FEATURES + NUMERIC_FEATURES].astype({'Apparatus': str})
+    return torch.as_tensor(np.asarray(preprocessor.transform(features), dtype=np.float32))
+
+
+def _state_version(state_dict):
+    buffer = io.BytesIO()
+    torch.save(state_dict, buffer)
+    return hashlib.sha256(buffer.getvalue()).hexdigest()[:16]
+
+
+def save_checkpoint(model, preprocessor, model_dir=MODEL_DIR, **meta):
+    """
+    This function saves the weights and the fitted preprocessor. The version is a hash of the weights, so every trained model gets its own
+
+    Args:
+        model: Gymnastics network
+        preprocessor: fitted ColumnTransformer
+        model_dir: directory of the files
+        meta: extra values stored in the checkpoint, such as the epoch and the validation loss
+
+    Returns:
+        version of the model
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    state_dict = {name: tensor.detach().clone() for name, tensor in model.state_dict().items()}
+    version = _state_version(state_dict)
+    joblib.dump(preprocessor, os.path.join(model_dir, PREPROCESSOR_FILE))
+    target = os.path.join(model_dir, CHECKPOINT_FILE)
+    torch.save(dict(meta, state_dict=state_dict, input_d=model.fc1.in_features, version=version), target + '.tmp')
+    os.replace(target + '.tmp', target) #never leaves a half-written checkpoint
+    return version
+
+
+def train(path="data_2022_2023.csv", model_dir=MODEL_DIR, epochs=500, batch_size=256, lr=0.001, patience=20, num_threads=None, seed=42, test_size=0.2):
+    """
+    This function trains the network with mini-batches and stops once the test loss has not improved for patience epochs. The best model is saved to model_dir every time it improves
+
+    Args:
+        path: path of the CSV
+        model_dir: directory of the checkpoint and of the fitted preprocessor
+        epochs: maximum number of epochs
+        batch_size: rows per mini-batch
+        lr: learning rate of Adam
+        patience: epochs without improvement before stopping
+        num_threads: number of CPU threads torch may use, unchanged when None
+        seed: seed of the split, of the initial weights and of the batch order
+        test_size: share of the rows held out to measure the loss
+
+    Returns:
+        (model with the best weights, dict with the 'train_loss' and 'test_loss' of every epoch and the 'version' of the saved model)
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    torch.manual_seed(seed)
+
+    features, target = training_data(path)
+    train_features, test_features, train_target, test_target = train_test_split(features, target, test_size=test_size, random_state=seed)
+
+    # the preprocessing only sees the training rows
+    preprocessor = build_preprocessor().fit(train_features)
+    train_X, test_X = to_tensor(preprocessor, train_features), to_tensor(preprocessor, test_features)
+    train_y = torch.as_tensor(train_target.to_numpy(dtype=np.float32)).view(-1, 1)
+    test_y = torch.as_tensor(test_target.to_numpy(dtype=np.float32)).view(-1, 1)
+    loader = DataLoader(TensorDataset(train_X, train_y), batch_size=batch_size, shuffle=True, generator=torch.Generator().manual_seed(seed))
+
+    gym_mod = Gymnastics(train_X.shape[1])
+    mseloss = nn.MSELoss()
+    optimization = torch.optim.Adam(gym_mod.parameters(), lr=lr)
+    history = {'train_loss': [], 'test_loss': [], 'version': None}
+    best_loss, best_state, stale = float('inf'), None, 0
+
+    for epoch in range(epochs):
+        gym_mod.train()
+        total = 0.0
+        for batch_X, batch_y in loader:
+            loss = mseloss(gym_mod(batch_X), batch_y)
+            optimization.zero_grad()
+            loss.backward()
+            optimization.step()
+            total += loss.item() * len(batch_X)
+
+        gym_mod.eval()
+        with torch.inference_mode():
+            test_loss = mseloss(gym_mod(test_X), test_y).item()
+        history['train_loss'].append(total / len(train_X))
+        history['test_loss'].append(test_loss)
+
+        if test_loss < best_loss:
+            best_loss, stale = test_loss, 0
+            best_state = {name: tensor.detach().clone() for name, tensor in gym_mod.state_dict().items()}
+            history['version'] = save_checkpoint(gym_mod, preprocessor, model_dir, epoch=epoch, test_loss=test_loss)
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+
+        if epoch % 100 == 0:
+            print(f"Epoch [{epoch+1}/{epochs}], Loss: {history['train_loss'][-1]:.4f}, Test Loss: {test_loss:.4f}")
+
+    gym_mod.load_state_dict(best_state)
+    gym_mod.eval()
+    print(f'\nBest Mean Squared Error on Test Set: {best_loss:.4f} (epoch {int(np.argmin(history["test_loss"])) + 1})')
+    _cached_model.cache_clear()
+    return gym_mod, history
+
+
+@lru_cache(maxsize=2)
+def _cached_model(checkpoint, preprocessor, mtime_ns):
+    state = torch.load(checkpoint, map_location='cpu')
+    gym_mod = Gymnastics(state['input_d'])
+    gym_mod.load_state_dict(state['state_dict'])
+    gym_mod.eval()
+    meta = {key: value for key, value in state.items() if key != 'state_dict'}
+    return gym_mod, joblib.load(preprocessor), meta
+
+
+def load_model(model_dir=MODEL_DIR, num_threads=None):
+    """
+    This function loads the saved model once per process and reuses it until a new checkpoint is saved
+
+    Args:
+        model_dir: directory of the checkpoint and of the fitted preprocessor
+        num_threads: number of CPU threads torch may use, unchanged when None
+
+    Returns:
+        (model in eval mode, fitted preprocessor, dict with the checkpoint's 'version', 'epoch' and 'test_loss')
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    checkpoint = os.path.abspath(os.path.join(model_dir, CHECKPOINT_FILE))
+    if not os.path.exists(checkpoint):
+        raise FileNotFoundError(f'{checkpoint} does not exist, train the model first with python -m myProject.model')
+    return _cached_model(checkpoint, os.path.abspath(os.path.join(model_dir, PREPROCESSOR_FILE)), os.stat(checkpoint).st_mtime_ns)
+
+
+def quantize(model):
+    """
+    This function converts the Linear layers of a model to int8 weights with dynamically quantized activations, which is faster on CPU for large batches
+
+    Args:
+        model: Gymnastics network
+
+    Returns:
+        quantized copy of the model
+    """
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def export_torchscript(model_dir=MODEL_DIR, quantized=False):
+    """
+    This function saves the saved model as TorchScript, which can be loaded with torch.jit.load without this module
+
+    Args:
+        model_dir: directory of the checkpoint
+        quantized: export the dynamically quantized variant
+
+    Returns:
+        path of the TorchScript file
+    """
+    gym_mod, _, meta = load_model(model_dir)
+    if quantized:
+        gym_mod = quantize(gym_mod)
+    target = os.path.join(model_dir, f"gymnastics{'-quantized' if quantized else ''}.ts")
+    example = torch.zeros(1, meta['input_d'])
+    with torch.inference_mode():
+        scripted = torch.jit.trace(gym_mod, example)
+    scripted.save(target)
+    return target
+
+
+def predict(model, preprocessor, features):
+    """
+    This function predicts the scores of every feature row in one forward pass
+
+    Args:
+        model: Gymnastics network, quantized network or TorchScript module
+        preprocessor: fitted ColumnTransformer
+        features: dataframe with the CATEGORICAL_FEATURES and NUMERIC_FEATURES columns
+
+    Returns:
+        1-D numpy array
+    """
+    if len(features) == 0:
+        return np.empty(0, dtype=np.float32)
+    with torch.inference_mode():
+        return model(to_tensor(preprocessor, features)).numpy().ravel()
+
+
+def refresh_predictions(database='gym', model_dir=MODEL_DIR, variant='float', num_threads=None):
+    """
+    This function stores the predicted score of every athlete and apparatus in the predicted_scores table, from their average E_Score, D_Score and Rank.
+    Nothing is computed when the predictions of this model version are already stored for the current data, so callers can run it on every start
+
+    Args:
+        database: path of the SQLite database
+        model_dir: directory of the checkpoint and of the fitted preprocessor
+        variant: 'float' runs the saved network, 'quantized' its dynamically quantized copy and gets its own model version
+        num_threads: number of CPU threads torch may use, unchanged when None
+
+    Returns:
+        model version of the stored predictions
+    """
+    if variant not in ('float', 'quantized'):
+        raise ValueError(f"variant must be 'float' or 'quantized', not {variant!r}")
+    gym_mod, preprocessor, meta = load_model(model_dir, num_threads)
+    model_version = meta['version'] + ('-int8' if variant == 'quantized' else '')
+    data_version = database_version(database)
+
+    with write_connection(database) as conn:
+        stored = conn.execute('SELECT data_version FROM prediction_runs WHERE model_version = ?', (model_version,)).fetchone()
+    if stored is not None and stored[0] == data_version:
+        return model_version
+
+    features = query_model_features(database)
+    scores = predict(quantize(gym_mod) if variant == 'quantized' else gym_mod, preprocessor, features)
+    rows = features[['Country', 'LastName', 'FirstName', 'Gender', 'Apparatus']].assign(PredictedScore=scores.astype(float))
+    with write_connection(database) as conn:
+        conn.execute('DELETE FROM predicted_scores WHERE model_version = ?', (model_version,))
+        conn.executemany(
+            'INSERT INTO predicted_scores VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((model_version, *row) for row in rows.itertuples(index=False, name=None)),
+        )
+        conn.execute('''
+            INSERT INTO prediction_runs (model_version, data_version) VALUES (?, ?)
+            ON CONFLICT (model_version) DO UPDATE SET data_version = excluded.data_version, created_at = CURRENT_TIMESTAMP
+        ''', (model_version, data_version))
+    return model_version
+
+
+def model_pivoted_database(database='gym', model_dir=MODEL_DIR, variant='float', include_spread=False):
+    """
+    This function is query_pivoted_database with the events predicted by the Gymnastics network, ready for monte_carlo and build_baseline
+
+    Args:
+        database: path of the SQLite database
+        model_dir: directory of the checkpoint and of the fitted preprocessor
+        variant: 'float' or 'quantized', see refresh_predictions
+        include_spread: see query_pivoted_database
+
+    Returns:
+        df with one row per athlete and a stable 'AthleteID' column
+    """
+    model_version = refresh_predictions(database, model_dir, variant)
+    return query_pivoted_database(database, include_spread, mean_model='model', model_version=model_version)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data_2022_2023.csv', help='results CSV to train on')
+    parser.add_argument('--model-dir', default=MODEL_DIR, help='directory of the checkpoint and of the fitted preprocessor')
+    parser.add_argument('--epochs', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--patience', type=int, default=20, help='epochs without improvement before stopping')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads used by torch')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default='gym', help='database the predicted scores are stored in')
+    parser.add_argument('--variant', choices=['float', 'quantized'], default='float', help='network used for the stored predictions')
+    parser.add_argument('--skip-training', action='store_true', help='only refresh the stored predictions of the saved model')
+    parser.add_argument('--torchscript', action='store_true', help='also export the saved model as TorchScript')
+    args = parser.parse_args()
+
+    if not args.skip_training:
+        _, history = train(args.data, args.model_dir, args.epochs, args.batch_size, args.lr, args.patience, args.threads, args.seed)
+        print(f"saved model version {history['version']} to {args.model_dir}")
+    if args.torchscript:
+        print(f"exported {export_torchscript(args.model_dir, quantized=args.variant == 'quantized')}")
+    print(f"stored the predicted scores of model version {refresh_predictions(args.database, args.model_dir, args.variant, args.threads)} in {args.database}")
+
+
+if __name__ == '__main__':
+    main()
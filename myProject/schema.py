@@ -0,0 +1,454 @@
+import sqlite3
+
+SCHEMA_VERSION = 7 #stored in PRAGMA user_version, bumped whenever a derived table changes shape
+FORM_HALF_LIFE_DAYS = 180 #a score counts half as much in the form rating after this many days, changing it needs a SCHEMA_VERSION bump
+
+# every athlete and competition is stored once, each result row only keeps two integer keys and its scores
+NORMALIZED_TABLES = '''
+CREATE TABLE IF NOT EXISTS athletes (
+    athlete_id INTEGER PRIMARY KEY,
+    LastName TEXT,
+    FirstName TEXT,
+    Gender TEXT,
+    Country TEXT,
+    UNIQUE (Country, LastName, FirstName, Gender)
+);
+
+CREATE TABLE IF NOT EXISTS competitions (
+    competition_id INTEGER PRIMARY KEY,
+    Competition TEXT,
+    Location TEXT,
+    Date TEXT,
+    StartDate TEXT, --ISO 8601 dates parsed from Date, NULL when it cannot be parsed
+    EndDate TEXT,
+    UNIQUE (Competition, Location, Date)
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    athlete_id INTEGER NOT NULL REFERENCES athletes,
+    competition_id INTEGER NOT NULL REFERENCES competitions,
+    Round TEXT,
+    Apparatus TEXT,
+    Rank REAL,
+    D_Score REAL,
+    E_Score REAL,
+    Penalty REAL,
+    Score REAL
+);
+
+CREATE INDEX IF NOT EXISTS results_athlete_apparatus ON results (athlete_id, Apparatus, Score);
+CREATE INDEX IF NOT EXISTS results_competition ON results (competition_id);
+CREATE INDEX IF NOT EXISTS competitions_start_date ON competitions (StartDate, EndDate);
+
+CREATE TABLE IF NOT EXISTS prediction_runs ( --one row per model version whose predictions are stored, with the database version they were made from
+    model_version TEXT PRIMARY KEY,
+    data_version INTEGER NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS predicted_scores ( --written by myProject.model.refresh_predictions
+    model_version TEXT,
+    Country TEXT,
+    LastName TEXT,
+    FirstName TEXT,
+    Gender TEXT,
+    Apparatus TEXT,
+    PredictedScore REAL,
+    PRIMARY KEY (model_version, Country, LastName, FirstName, Gender, Apparatus)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS ingests ( --one row per file loaded by myProject.ingest, the latest id versions the data
+    ingest_id INTEGER PRIMARY KEY,
+    source TEXT,
+    rows INTEGER,
+    ingested_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+# gym keeps its original columns as a view over the normalized tables
+GYM_VIEW = '''
+CREATE VIEW gym AS
+SELECT a.LastName, a.FirstName, a.Gender, a.Country, c.Date, c.Competition, r.Round, c.Location,
+       r.Apparatus, r.Rank, r.D_Score, r.E_Score, r.Penalty, r.Score
+FROM results AS r
+JOIN athletes AS a ON a.athlete_id = r.athlete_id
+JOIN competitions AS c ON c.competition_id = r.competition_id
+'''
+
+# rows inserted into the gym view are split into the athlete, the competition and the result.
+# Triggers only use built-in SQL so SQLite clients without the project's functions can insert: a new competition's StartDate and EndDate are filled by
+# myProject.ingest, which adds the competitions with their parsed dates first, or later by ensure_schema for other clients
+GYM_INSERT_TRIGGER = '''
+CREATE TRIGGER gym_insert INSTEAD OF INSERT ON gym
+BEGIN
+    INSERT OR IGNORE INTO athletes (LastName, FirstName, Gender, Country)
+    VALUES (NEW.LastName, NEW.FirstName, NEW.Gender, NEW.Country);
+
+    INSERT OR IGNORE INTO competitions (Competition, Location, Date)
+    VALUES (NEW.Competition, NEW.Location, NEW.Date);
+
+    INSERT INTO results (athlete_id, competition_id, Round, Apparatus, Rank, D_Score, E_Score, Penalty, Score)
+    VALUES (
+        (SELECT athlete_id FROM athletes
+         WHERE Country IS NEW.Country AND LastName IS NEW.LastName AND FirstName IS NEW.FirstName AND Gender IS NEW.Gender),
+        (SELECT competition_id FROM competitions
+         WHERE Competition IS NEW.Competition AND Location IS NEW.Location AND Date IS NEW.Date),
+        NEW.Round, NEW.Apparatus, NEW.Rank, NEW.D_Score, NEW.E_Score, NEW.Penalty, NEW.Score
+    );
+END
+'''
+
+STATS_TABLES = '''
+CREATE TABLE IF NOT EXISTS athlete_apparatus_stats (
+    Country TEXT,
+    LastName TEXT,
+    FirstName TEXT,
+    Gender TEXT,
+    Apparatus TEXT,
+    n INTEGER NOT NULL,
+    sum_score REAL NOT NULL,
+    m2 REAL NOT NULL,
+    max_score REAL NOT NULL,
+    competitions INTEGER NOT NULL,
+    PRIMARY KEY (Country, LastName, FirstName, Gender, Apparatus)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS athlete_apparatus_dates (
+    Country TEXT,
+    LastName TEXT,
+    FirstName TEXT,
+    Gender TEXT,
+    Apparatus TEXT,
+    Date TEXT,
+    PRIMARY KEY (Country, LastName, FirstName, Gender, Apparatus, Date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS athlete_apparatus_form ( --the form rating is decayed_sum / decayed_weight, recent scores weigh more
+    Country TEXT,
+    LastName TEXT,
+    FirstName TEXT,
+    Gender TEXT,
+    Apparatus TEXT,
+    decayed_sum REAL NOT NULL,
+    decayed_weight REAL NOT NULL,
+    last_date TEXT NOT NULL, --StartDate of the latest competition, both sums are decayed to this day
+    PRIMARY KEY (Country, LastName, FirstName, Gender, Apparatus)
+) WITHOUT ROWID;
+'''
+
+# keeps the running sums of one athlete and apparatus up to date for every scored result inserted
+# m2 is Welford's sum of squared deviations from the mean, the SET expressions all see the old row
+STATS_TRIGGER = '''
+CREATE TRIGGER results_athlete_apparatus_stats AFTER INSERT ON results
+WHEN NEW.Score IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO athlete_apparatus_dates (Country, LastName, FirstName, Gender, Apparatus, Date)
+    SELECT a.Country, a.LastName, a.FirstName, a.Gender, NEW.Apparatus, c.Date
+    FROM athletes AS a, competitions AS c
+    WHERE a.athlete_id = NEW.athlete_id AND c.competition_id = NEW.competition_id;
+
+    INSERT INTO athlete_apparatus_stats (Country, LastName, FirstName, Gender, Apparatus, n, sum_score, m2, max_score, competitions)
+    SELECT a.Country, a.LastName, a.FirstName, a.Gender, NEW.Apparatus, 1, NEW.Score, 0.0, NEW.Score, 1
+    FROM athletes AS a
+    WHERE a.athlete_id = NEW.athlete_id
+    ON CONFLICT (Country, LastName, FirstName, Gender, Apparatus) DO UPDATE SET
+        n = n + 1,
+        sum_score = sum_score + excluded.sum_score,
+        m2 = m2 + (excluded.sum_score - sum_score / n) * (excluded.sum_score - (sum_score + excluded.sum_score) / (n + 1)),
+        max_score = MAX(max_score, excluded.max_score),
+        competitions = (
+            SELECT COUNT(*) FROM athlete_apparatus_dates AS d
+            WHERE d.Country IS excluded.Country AND d.LastName IS excluded.LastName AND d.FirstName IS excluded.FirstName
+              AND d.Gender IS excluded.Gender AND d.Apparatus IS excluded.Apparatus
+        );
+END
+'''
+
+
+def form_decay(days):
+    """
+    This function writes the weight left to a score after some days in the form rating, halved every FORM_HALF_LIFE_DAYS, as plain SQL.
+    It only uses SQLite's built-in math functions, so the form trigger also runs in clients that do not have the project's functions,
+    as long as their SQLite was built with SQLITE_ENABLE_MATH_FUNCTIONS, see check_math_functions
+
+    Args:
+        days: SQL expression of the age of the score
+
+    Returns:
+        str, SQL expression
+    """
+    return f'exp(-ln(2) * ({days}) / {FORM_HALF_LIFE_DAYS})'
+
+
+# keeps the form rating of one athlete and apparatus up to date in O(1) for every scored result with a parsed date.
+# A newer result decays the stored sums to its own date before being added, an older one is decayed to the stored date
+FORM_TRIGGER = f'''
+CREATE TRIGGER results_athlete_apparatus_form AFTER INSERT ON results
+WHEN NEW.Score IS NOT NULL
+BEGIN
+    INSERT INTO athlete_apparatus_form (Country, LastName, FirstName, Gender, Apparatus, decayed_sum, decayed_weight, last_date)
+    SELECT a.Country, a.LastName, a.FirstName, a.Gender, NEW.Apparatus, NEW.Score, 1.0, c.StartDate
+    FROM athletes AS a, competitions AS c
+    WHERE a.athlete_id = NEW.athlete_id AND c.competition_id = NEW.competition_id AND c.StartDate IS NOT NULL
+    ON CONFLICT (Country, LastName, FirstName, Gender, Apparatus) DO UPDATE SET
+        decayed_sum = CASE WHEN excluded.last_date > last_date
+            THEN decayed_sum * {form_decay('julianday(excluded.last_date) - julianday(last_date)')} + excluded.decayed_sum
+            ELSE decayed_sum + excluded.decayed_sum * {form_decay('julianday(last_date) - julianday(excluded.last_date)')} END,
+        decayed_weight = CASE WHEN excluded.last_date > last_date
+            THEN decayed_weight * {form_decay('julianday(excluded.last_date) - julianday(last_date)')} + 1.0
+            ELSE decayed_weight + {form_decay('julianday(last_date) - julianday(excluded.last_date)')} END,
+        last_date = MAX(last_date, excluded.last_date);
+END
+'''
+
+
+def refresh_athlete_apparatus_stats(conn):
+    """
+    This function rebuilds the athlete_apparatus_stats summary from every row of gym. It is only needed when the data was replaced wholesale, inserts keep the summary up to date on their own
+
+    Args:
+        conn: writable sqlite3 connection
+
+    Returns:
+        None
+    """
+    conn.execute('DELETE FROM athlete_apparatus_dates')
+    conn.execute('DELETE FROM athlete_apparatus_stats')
+    conn.execute('''
+        INSERT INTO athlete_apparatus_dates (Country, LastName, FirstName, Gender, Apparatus, Date)
+        SELECT DISTINCT Country, LastName, FirstName, Gender, Apparatus, Date
+        FROM gym WHERE Score IS NOT NULL
+    ''')
+    conn.execute('''
+        INSERT INTO athlete_apparatus_stats (Country, LastName, FirstName, Gender, Apparatus, n, sum_score, m2, max_score, competitions)
+        SELECT Country, LastName, FirstName, Gender, Apparatus,
+               COUNT(*), SUM(Score), sum_sq_dev(Score), MAX(Score), COUNT(DISTINCT Date)
+        FROM gym WHERE Score IS NOT NULL
+        GROUP BY Country, LastName, FirstName, Gender, Apparatus
+    ''')
+
+
+def refresh_athlete_apparatus_form(conn):
+    """
+    This function rebuilds the athlete_apparatus_form ratings from every dated result, like refresh_athlete_apparatus_stats for the stats
+
+    Args:
+        conn: writable sqlite3 connection
+
+    Returns:
+        None
+    """
+    conn.execute('DELETE FROM athlete_apparatus_form')
+    conn.execute(f'''
+        INSERT INTO athlete_apparatus_form (Country, LastName, FirstName, Gender, Apparatus, decayed_sum, decayed_weight, last_date)
+        SELECT a.Country, a.LastName, a.FirstName, a.Gender, d.Apparatus,
+               SUM(d.Score * {form_decay('julianday(d.last_date) - julianday(d.StartDate)')}),
+               SUM({form_decay('julianday(d.last_date) - julianday(d.StartDate)')}),
+               d.last_date
+        FROM (
+            SELECT r.athlete_id, r.Apparatus, r.Score, c.StartDate,
+                   MAX(c.StartDate) OVER (PARTITION BY r.athlete_id, r.Apparatus) AS last_date
+            FROM results AS r
+            JOIN competitions AS c ON c.competition_id = r.competition_id
+            WHERE r.Score IS NOT NULL AND c.StartDate IS NOT NULL
+        ) AS d
+        JOIN athletes AS a ON a.athlete_id = d.athlete_id
+        GROUP BY d.athlete_id, d.Apparatus
+    ''')
+
+
+def fill_competition_dates(conn):
+    """
+    This function parses the dates of the competitions inserted into gym by clients other than myProject.ingest, which leave StartDate and EndDate empty
+
+    Args:
+        conn: writable sqlite3 connection with the functions of db.register_functions
+
+    Returns:
+        number of competitions that got their dates
+    """
+    return conn.execute('''
+        UPDATE competitions SET StartDate = date_range_start(Date), EndDate = date_range_end(Date)
+        WHERE StartDate IS NULL AND date_range_start(Date) IS NOT NULL
+    ''').rowcount
+
+
+# the spaces data_cleaning strips from names, SQLite's trim() alone only removes the ASCII space and not the CSV's non-breaking one
+NAME_SPACES = "char(32, 9, 10, 13, 160)"
+
+
+def trim_athlete_names(conn):
+    """
+    This function strips the spaces around the names of the stored athletes, as data_cleaning does for new rows. An athlete whose name only differed by
+    those spaces is merged into the other one with their results, so the derived summaries must be rebuilt afterwards
+
+    Args:
+        conn: writable sqlite3 connection
+
+    Returns:
+        number of athletes renamed or merged
+    """
+    trimmed = ', '.join(f'trim({column}, {NAME_SPACES})' for column in ('Country', 'LastName', 'FirstName'))
+    conn.execute('DROP TABLE IF EXISTS temp.athlete_merges')
+    conn.execute(f'''
+        CREATE TEMP TABLE athlete_merges AS
+        SELECT athlete_id AS old_id, new_id FROM (
+            SELECT athlete_id, MIN(athlete_id) OVER (PARTITION BY {trimmed}, Gender) AS new_id FROM athletes
+        ) WHERE athlete_id != new_id
+    ''')
+    conn.execute('''
+        UPDATE results SET athlete_id = (SELECT new_id FROM athlete_merges WHERE old_id = results.athlete_id)
+        WHERE athlete_id IN (SELECT old_id FROM athlete_merges)
+    ''')
+    merged = conn.execute('DELETE FROM athletes WHERE athlete_id IN (SELECT old_id FROM athlete_merges)').rowcount
+    conn.execute('DROP TABLE athlete_merges')
+    renamed = 0
+    for table in ('athletes', 'predicted_scores'):
+        renamed += conn.execute(f'''
+            UPDATE OR REPLACE {table} SET {', '.join(f'{column} = trim({column}, {NAME_SPACES})' for column in ('Country', 'LastName', 'FirstName'))}
+            WHERE {' OR '.join(f'{column} != trim({column}, {NAME_SPACES})' for column in ('Country', 'LastName', 'FirstName'))}
+        ''').rowcount
+    return merged + renamed
+
+
+def check_math_functions(conn):
+    """
+    This function makes sure the SQLite library has the math functions the form trigger uses. They are optional in SQLite builds,
+    and without them every insert into results would fail with 'no such function'
+
+    Args:
+        conn: sqlite3 connection
+
+    Raises:
+        RuntimeError: when exp() or ln() is missing
+
+    Returns:
+        None
+    """
+    try:
+        conn.execute('SELECT exp(1), ln(2)').fetchone()
+    except sqlite3.OperationalError as error:
+        raise RuntimeError(
+            f'SQLite {sqlite3.sqlite_version} was built without its math functions ({error}), which the form ratings need. '
+            'Use a Python whose SQLite is 3.35 or newer and built with SQLITE_ENABLE_MATH_FUNCTIONS'
+        ) from error
+
+
+class SchemaOutdated(RuntimeError):
+    """
+    Raised when a database is read before it was migrated to the current SCHEMA_VERSION
+    """
+
+
+def _object_type(conn, name):
+    row = conn.execute('SELECT type FROM sqlite_master WHERE name = ?', (name,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def normalize_gym(conn):
+    """
+    This function moves the rows of a gym table into the athletes, competitions and results tables and replaces the table with the gym view.
+    The normalized tables are emptied first, the gym table is the source of truth when it exists
+
+    Args:
+        conn: writable sqlite3 connection with the functions of db.register_functions
+
+    Returns:
+        None
+    """
+    conn.execute('DELETE FROM results')
+    conn.execute('DELETE FROM athletes')
+    conn.execute('DELETE FROM competitions')
+    conn.execute('''
+        INSERT INTO athletes (LastName, FirstName, Gender, Country)
+        SELECT DISTINCT LastName, FirstName, Gender, Country FROM gym ORDER BY Country, LastName, FirstName, Gender
+    ''')
+    conn.execute('''
+        INSERT INTO competitions (Competition, Location, Date, StartDate, EndDate)
+        SELECT Competition, Location, Date, date_range_start(Date), date_range_end(Date)
+        FROM (SELECT DISTINCT Competition, Location, Date FROM gym)
+        ORDER BY date_range_start(Date), Competition
+    ''')
+    conn.execute('''
+        INSERT INTO results (athlete_id, competition_id, Round, Apparatus, Rank, D_Score, E_Score, Penalty, Score)
+        SELECT a.athlete_id, c.competition_id, g.Round, g.Apparatus, g.Rank, g.D_Score, g.E_Score, g.Penalty, g.Score
+        FROM gym AS g
+        JOIN athletes AS a ON a.Country IS g.Country AND a.LastName IS g.LastName AND a.FirstName IS g.FirstName AND a.Gender IS g.Gender
+        JOIN competitions AS c ON c.Competition IS g.Competition AND c.Location IS g.Location AND c.Date IS g.Date
+        ORDER BY g.rowid
+    ''')
+    conn.execute('DROP TABLE gym') #also drops its indexes and the stats trigger of older versions
+    conn.execute(GYM_VIEW)
+
+
+def ensure_schema(conn):
+    """
+    This function creates the normalized athletes, competitions and results tables behind the gym view, the summary and form tables, and the triggers that maintain them.
+    A gym table, from an older version or replaced with to_sql, is migrated into the normalized tables first. When a trigger is missing its table is rebuilt from the raw rows.
+    Summaries written by an older SCHEMA_VERSION are dropped and rebuilt, after the stored names are trimmed with trim_athlete_names
+
+    Args:
+        conn: writable sqlite3 connection with the functions of db.register_functions
+
+    Raises:
+        RuntimeError: when SQLite lacks the math functions of the form trigger, before anything is changed
+
+    Returns:
+        None
+    """
+    check_math_functions(conn)
+    upgrade = conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION
+    if upgrade:
+        conn.execute('DROP TRIGGER IF EXISTS gym_athlete_apparatus_stats')
+        conn.execute('DROP TRIGGER IF EXISTS gym_insert') #older versions called Python functions
+        conn.execute('DROP TRIGGER IF EXISTS results_athlete_apparatus_stats') #recreated below, which rebuilds the dropped summaries
+        conn.execute('DROP TRIGGER IF EXISTS results_athlete_apparatus_form')
+        conn.execute('DROP TABLE IF EXISTS athlete_apparatus_stats')
+        conn.execute('DROP TABLE IF EXISTS athlete_apparatus_dates')
+        conn.execute('DROP TABLE IF EXISTS athlete_apparatus_form')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.executescript(STATS_TABLES + NORMALIZED_TABLES)
+
+    if _object_type(conn, 'gym') == 'table':
+        conn.execute('DROP TRIGGER IF EXISTS results_athlete_apparatus_stats') #the summaries are rebuilt after the move
+        conn.execute('DROP TRIGGER IF EXISTS results_athlete_apparatus_form')
+        normalize_gym(conn)
+        upgrade = True
+    elif _object_type(conn, 'gym') is None:
+        conn.execute(GYM_VIEW)
+    if upgrade:
+        trim_athlete_names(conn) #the summaries are rebuilt below, they were dropped with the old version or never built
+    if _object_type(conn, 'gym_insert') is None:
+        conn.execute(GYM_INSERT_TRIGGER)
+    dated = fill_competition_dates(conn)
+    if _object_type(conn, 'results_athlete_apparatus_stats') is None:
+        conn.execute(STATS_TRIGGER)
+        refresh_athlete_apparatus_stats(conn)
+    if _object_type(conn, 'results_athlete_apparatus_form') is None:
+        conn.execute(FORM_TRIGGER)
+        refresh_athlete_apparatus_form(conn)
+    elif dated:
+        refresh_athlete_apparatus_form(conn) #results of the newly dated competitions were skipped by the form trigger
+
+
+def check_schema(conn):
+    """
+    This function makes sure a database is on the current schema before it is read. Reads never migrate: the migration rewrites the file,
+    so it only runs through the explicit normalize command
+
+    Args:
+        conn: sqlite3 connection, read-only connections are enough
+
+    Raises:
+        SchemaOutdated: when gym is still a table or the summaries were built by an older SCHEMA_VERSION
+
+    Returns:
+        None
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < SCHEMA_VERSION or _object_type(conn, 'gym') != 'view':
+        path = conn.execute('PRAGMA database_list').fetchone()[2]
+        raise SchemaOutdated(
+            f'{path} uses schema version {version}, this code needs version {SCHEMA_VERSION}. '
+            f'Migrate it once with: python -m myProject.sqlPlots --database {path}'
+        )
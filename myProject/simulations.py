@@ -1,5 +1,24 @@
-from plotly import express as px
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from statistics import NormalDist
+
 import numpy as np
+import pandas as pd
+
+try:
+    from .sqlPlots import add_athlete_ids, athlete_id, database_version, latest_model_version, query_athlete_scores, query_pivoted_database, pivot_events, summarize_scores
+    from .data import event_key
+    from .team import EVENTS, best_team
+except ImportError: #imported as a top-level module by app.py
+    from sqlPlots import add_athlete_ids, athlete_id, database_version, latest_model_version, query_athlete_scores, query_pivoted_database, pivot_events, summarize_scores
+    from data import event_key
+    from team import EVENTS, best_team
+
+SIMULATION_CHUNK_SIZE = 10_000 #simulations per random stream, fixed so results do not depend on the number of workers
+BASELINE_CACHE_SIZE = 4 #baselines kept by pivoted_baseline
+
+_BASELINES = {} #(n_simulations, seed, data_version, mean_model, model_version) to baseline, oldest first
+
 def add_user_entry(df, FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore):
     """
     This function allows users to add a new entry into the database
@@ -18,7 +37,20 @@ def add_user_entry(df, FirstName, LastName, Country, BB_PredictedScore, VT_Predi
         dataframe
     """
     index = len(df)
-    df.loc[index] = [FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore]
+    entry = {
+        'LastName': LastName,
+        'FirstName': FirstName,
+        'Country': Country,
+        'BB_PredictedScore': BB_PredictedScore,
+        'VT_PredictedScore': VT_PredictedScore,
+        'FX_PredictedScore': FX_PredictedScore,
+        'UB_PredictedScore': UB_PredictedScore,
+    }
+    if 'AthleteID' in df.columns:
+        entry['AthleteID'] = athlete_id(LastName, FirstName, Country, 'w')
+    if 'Gender' in df.columns:
+        entry['Gender'] = 'w' #the entry competes in the women's events
+    df.loc[index] = pd.Series(entry)
     print(df)
     return df
 
@@ -38,41 +70,814 @@ def delete_recent_entry(df):
     df = df.drop(index - 1)
     print(df)
     
-def monte_carlo(df):
+def _bootstrap_scores(means, noise_sd, bootstrap, num_rows, rng):
+    """
+    This function draws simulated scores by resampling every athlete's real scores. Athletes without any history fall back to normal noise around their predicted score
+
+    Args:
+        means: array of the predicted scores of the athletes entered in the event, or (n_events, width) for _batched_podiums
+        noise_sd: standard deviation of the fallback noise, a number or one per athlete
+        bootstrap: (values, offsets, counts) shaped like means, where athlete i's real scores are values[offsets[i]:offsets[i] + counts[i]]
+        num_rows: number of simulations to draw
+        rng: numpy random Generator
+
+    Returns:
+        (num_rows, *means.shape) array of simulated scores
+    """
+    values, offsets, counts = bootstrap
+    picks = offsets + (rng.random((num_rows,) + means.shape) * counts).astype(np.intp) #uniform pick inside every athlete's own scores
+    simulated_scores = values[np.minimum(picks, len(values) - 1)] if len(values) else np.empty((num_rows,) + means.shape)
+    no_history = counts == 0
+    if no_history.any():
+        fallback_sd = np.broadcast_to(noise_sd, means.shape)[no_history]
+        simulated_scores[:, no_history] = means[no_history] + rng.normal(0, fallback_sd, size=(num_rows, no_history.sum()))
+    return simulated_scores
+
+
+def _event_podiums(means, num_simulations, rng, noise_sd=0.1, block_size=2_000_000, return_scores=False, bootstrap=None):
+    """
+    This function simulates one event for many simulations at once and returns the top three finishers of each one
+
+    Args:
+        means: 1-D array of the predicted scores of the athletes entered in the event
+        num_simulations: number of simulations to run
+        rng: numpy random Generator used to draw the noise
+        noise_sd: standard deviation of the noise added to the predicted scores, a number or one per athlete
+        block_size: maximum number of simulated scores held in memory at once
+        return_scores: also return the simulated scores of the podium finishers
+        bootstrap: optional (values, offsets, counts) of the athletes' real scores to resample instead of adding noise
+
+    Returns:
+        (num_simulations, 3) array of positions into means, gold first, and the matching scores if return_scores is set
+    """
+    num_athletes = len(means)
+    num_medals = min(3, num_athletes)
+    podiums = np.empty((num_simulations, num_medals), dtype=np.intp)
+    podium_scores = np.empty((num_simulations, num_medals)) if return_scores else None
+    rows_per_block = max(1, block_size // max(num_athletes, 1))
+
+    for start in range(0, num_simulations, rows_per_block):
+        stop = min(start + rows_per_block, num_simulations)
+        if bootstrap is None:
+            simulated_scores = means + rng.normal(0, noise_sd, size=(stop - start, num_athletes)) #add noise to create simulated scores for the whole block
+        else:
+            simulated_scores = _bootstrap_scores(means, noise_sd, bootstrap, stop - start, rng)
+        if num_athletes > num_medals:
+            top = np.argpartition(-simulated_scores, num_medals - 1, axis=1)[:, :num_medals] #unordered top three of every simulation
+        else:
+            top = np.broadcast_to(np.arange(num_athletes), (stop - start, num_athletes))
+        top_scores = np.take_along_axis(simulated_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1) #order the top three from highest to lowest
+        podiums[start:stop] = np.take_along_axis(top, order, axis=1)
+        if return_scores:
+            podium_scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    if return_scores:
+        return podiums, podium_scores
+    return podiums
+
+
+def _stack_events(entries):
+    """
+    This function lays out the entered athletes of every event side by side in (n_events, width) arrays padded to the largest event,
+    so that all the events of both disciplines are drawn as one noise tensor
+
+    Args:
+        entries: list of (event, entered, means, noise_sd, bootstrap) tuples from _simulation_events
+
+    Returns:
+        (means, noise_sd, bootstrap) where padded places have a mean of -inf and no noise, so they never reach a podium ahead of an athlete,
+        and bootstrap is the concatenated (values, offsets, counts) of every event or None
+    """
+    width = max(len(entered) for _, entered, _, _, _ in entries)
+    means = np.full((len(entries), width), -np.inf)
+    noise_sd = np.zeros((len(entries), width))
+    offsets = np.zeros((len(entries), width), dtype=np.intp)
+    counts = np.zeros((len(entries), width), dtype=np.intp) #padded places have no history, so they fall back to noise around -inf
+    values = []
+    size = 0
+    for e, (_, entered, event_means, event_sd, bootstrap) in enumerate(entries):
+        means[e, :len(entered)] = event_means
+        noise_sd[e, :len(entered)] = event_sd
+        if bootstrap is not None:
+            event_values, event_offsets, event_counts = bootstrap
+            offsets[e, :len(entered)] = event_offsets + size
+            counts[e, :len(entered)] = event_counts
+            values.append(event_values)
+            size += len(event_values)
+    bootstrap = (np.concatenate(values), offsets, counts) if values else None
+    return means, noise_sd, bootstrap
+
+
+def _batched_podiums(stacked, num_simulations, rng, block_size=2_000_000):
+    """
+    This function simulates every event at once from one (num_simulations, n_events, width) tensor of simulated scores and returns the top three finishers of each event
+
+    Args:
+        stacked: (means, noise_sd, bootstrap) from _stack_events
+        num_simulations: number of simulations to run
+        rng: numpy random Generator used to draw the noise
+        block_size: maximum number of simulated scores held in memory at once
+
+    Returns:
+        (num_simulations, n_events, 3) array of positions into each event's entered athletes, gold first.
+        A position past the number of entered athletes is a padded place, only found in events with fewer than three athletes
+    """
+    means, noise_sd, bootstrap = stacked
+    num_events, width = means.shape
+    num_medals = min(3, width)
+    podiums = np.empty((num_simulations, num_events, num_medals), dtype=np.intp)
+    rows_per_block = max(1, block_size // max(means.size, 1))
+
+    for start in range(0, num_simulations, rows_per_block):
+        stop = min(start + rows_per_block, num_simulations)
+        if bootstrap is None:
+            simulated_scores = means + noise_sd * rng.standard_normal((stop - start, num_events, width)) #one noise tensor for every event of the block
+        else:
+            simulated_scores = _bootstrap_scores(means, noise_sd, bootstrap, stop - start, rng)
+        if width > num_medals:
+            top = np.argpartition(-simulated_scores, num_medals - 1, axis=2)[..., :num_medals] #unordered top three of every event and simulation
+        else:
+            top = np.broadcast_to(np.arange(width), simulated_scores.shape)
+        top_scores = np.take_along_axis(simulated_scores, top, axis=2)
+        order = np.argsort(-top_scores, axis=2) #order the top three from highest to lowest
+        podiums[start:stop] = np.take_along_axis(top, order, axis=2)
+    return podiums
+
+
+def _tally_podiums(podiums, num_athletes):
+    """
+    This function counts how many gold, silver and bronze medals every athlete won across the simulated podiums
+
+    Args:
+        podiums: (num_simulations, 3) array of athlete positions, gold first, where -1 marks a medal nobody won
+        num_athletes: number of athletes the positions refer to
+
+    Returns:
+        (num_athletes, 3) array of gold, silver and bronze counts
+    """
+    tally = np.zeros((num_athletes, 3), dtype=np.int64)
+    for medal in range(podiums.shape[1]):
+        winners = podiums[:, medal]
+        tally[:, medal] = np.bincount(winners[winners >= 0], minlength=num_athletes)
+    return tally
+
+
+def _simulate_chunk(events, num_keys, num_simulations, seed_sequence):
+    """
+    This function runs one chunk of simulations of every event with its own random stream. It is the unit of work handed to the process pool
+
+    Args:
+        events: (stacked, keys) where stacked comes from _stack_events and keys is the (n_events, width) array of the athlete positions of the entered athletes, -1 for padded places
+        num_keys: number of distinct athletes medals are credited to
+        num_simulations: number of simulations in this chunk
+        seed_sequence: numpy SeedSequence of this chunk
+
+    Returns:
+        (num_keys, 3) array of gold, silver and bronze counts
+    """
+    stacked, keys = events
+    podiums = _batched_podiums(stacked, num_simulations, np.random.default_rng(seed_sequence))
+    winners = keys[np.arange(len(keys))[:, None], podiums] #(num_simulations, n_events, 3) athlete positions
+    return _tally_podiums(winners.reshape(-1, podiums.shape[2]), num_keys)
+
+
+def _run_chunks(events, num_keys, n_simulations, seed, n_workers, chunk_size=SIMULATION_CHUNK_SIZE, progress=None):
+    """
+    This function splits the simulations into fixed-size chunks, runs them inline or on a process pool and merges the medal tallies.
+    Every chunk gets its own child of the seed's SeedSequence, so the result only depends on the seed and never on n_workers
+
+    Args:
+        events: (stacked, keys), see _simulate_chunk
+        num_keys: number of distinct athletes medals are credited to
+        n_simulations: total number of simulations
+        seed: seed of the run, None for fresh entropy
+        n_workers: number of worker processes, 1 runs everything in this process
+        chunk_size: number of simulations per chunk
+        progress: optional callable called with the fraction of chunks done after every chunk
+
+    Returns:
+        (num_keys, 3) array of gold, silver and bronze counts
+    """
+    chunk_sizes = [min(chunk_size, n_simulations - start) for start in range(0, n_simulations, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    medals = np.zeros((num_keys, 3), dtype=np.int64)
+
+    if n_workers is None or n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunk_medals = executor.map(_simulate_chunk, repeat(events), repeat(num_keys), chunk_sizes, seed_sequences)
+            for done, tally in enumerate(chunk_medals, 1):
+                medals += tally
+                if progress is not None:
+                    progress(done / len(chunk_sizes))
+    else:
+        for done, (size, seed_sequence) in enumerate(zip(chunk_sizes, seed_sequences), 1):
+            medals += _simulate_chunk(events, num_keys, size, seed_sequence)
+            if progress is not None:
+                progress(done / len(chunk_sizes))
+    return medals
+
+
+def _apparatus_variance(std_dev, counts):
+    """
+    This function pools the score variance of every athlete with at least two competitions on an apparatus, weighted by their number of competitions
+
+    Args:
+        std_dev: 1-D array of the athletes' standard deviations
+        counts: 1-D array of the athletes' number of competitions
+
+    Returns:
+        float, 0.1 ** 2 when no athlete has enough history
     """
-    This function allows users to run Monte Carlo simulations to see the expected medal count of each gymnast
+    repeated = (counts >= 2) & ~np.isnan(std_dev)
+    if not repeated.any():
+        return 0.1 ** 2
+    return float(np.average(std_dev[repeated] ** 2, weights=counts[repeated]))
+
+
+def _shrunk_noise_sd(std_dev, counts, prior_strength):
+    """
+    This function shrinks every athlete's variance toward the apparatus-level variance. An athlete with few competitions mostly gets the apparatus variance, an athlete with many keeps their own
+
+    Args:
+        std_dev: 1-D array of the athletes' standard deviations, NaN when unknown
+        counts: 1-D array of the athletes' number of competitions, NaN when unknown
+        prior_strength: number of competitions the apparatus variance is worth
+
+    Returns:
+        1-D array of standard deviations
+    """
+    counts = np.nan_to_num(counts)
+    apparatus_variance = _apparatus_variance(std_dev, counts)
+    variance = np.where(np.isnan(std_dev), apparatus_variance, std_dev ** 2)
+    return np.sqrt((counts * variance + prior_strength * apparatus_variance) / (counts + prior_strength))
+
+
+def _bootstrap_index(scores, event, athlete_ids):
+    """
+    This function lays out the real scores of one event so that every entered athlete's scores are one contiguous slice
+
+    Args:
+        scores: dataframe from query_athlete_scores with 'AthleteID' and 'Event' columns
+        event: event key, see data.event_key
+        athlete_ids: 1-D array of the IDs of the entered athletes
+
+    Returns:
+        (values, offsets, counts) for _bootstrap_scores
+    """
+    event_scores = scores[scores['Event'] == event].sort_values('AthleteID')
+    ids = event_scores['AthleteID'].to_numpy()
+    offsets = np.searchsorted(ids, athlete_ids, side='left')
+    counts = np.searchsorted(ids, athlete_ids, side='right') - offsets
+    return event_scores['Score'].to_numpy(dtype=float), offsets, counts
+
+
+def _simulation_events(df, noise_model='fixed', scores=None, prior_strength=3):
+    """
+    This function prepares the apparatus finals of monte_carlo and adaptive_monte_carlo: who is entered in every event and how their scores are drawn
 
     Args:
         df: dataframe
-      
+        noise_model: 'fixed', 'normal' or 'bootstrap', see monte_carlo
+        scores: dataframe from query_athlete_scores for 'bootstrap', queried when not given
+        prior_strength: number of competitions the apparatus variance is worth when shrinking
 
     Returns:
-        dataframe
+        (df with an 'AthleteID' column, list of (event, entered, means, noise_sd, bootstrap) tuples) where entered are the row positions of the entered athletes
+    """
+    list_of_events = pivot_events(df) #every event of both disciplines found in df
+
+    if noise_model not in ('fixed', 'normal', 'bootstrap'):
+        raise ValueError(f"noise_model must be 'fixed', 'normal' or 'bootstrap', not {noise_model!r}")
+    if 'AthleteID' not in df.columns:
+        df = add_athlete_ids(df)
+    duplicated = df['AthleteID'].duplicated(keep=False)
+    if duplicated.any(): #medals are tallied per ID, two rows with one ID would both be credited with the sum
+        names = ', '.join(sorted({f'{row.LastName} {row.FirstName} ({row.Country})' for row in df[duplicated].itertuples()}))
+        raise ValueError(f'several rows have the same AthleteID, remove the repeated athletes: {names}')
+    if noise_model == 'bootstrap':
+        scores = add_athlete_ids((query_athlete_scores() if scores is None else scores).copy())
+        scores['Event'] = [event_key(gender, apparatus) for gender, apparatus in zip(scores['Gender'], scores['Apparatus'])] #men's FX scores are m_FX, not the women's FX
+    entries = []
+    for event in list_of_events:
+        means = df[f'{event}_PredictedScore'].to_numpy(dtype=float)
+        entered = np.flatnonzero(~np.isnan(means)) #only select athletes that compete in the specific event
+        if len(entered) == 0:
+            continue
+
+        noise_sd = 0.1
+        bootstrap = None
+        if noise_model == 'normal':
+            if f'{event}_StdDevScore' not in df.columns:
+                raise ValueError("noise_model='normal' needs the columns of query_pivoted_database(include_spread=True)")
+            std_dev = df[f'{event}_StdDevScore'].to_numpy(dtype=float)[entered]
+            counts = df[f'{event}_CompetitionsCount'].to_numpy(dtype=float)[entered]
+            noise_sd = _shrunk_noise_sd(std_dev, counts, prior_strength)
+        elif noise_model == 'bootstrap':
+            bootstrap = _bootstrap_index(scores, event, df['AthleteID'].to_numpy()[entered])
+            history = summarize_scores(scores[scores['Event'] == event], by=('AthleteID',))
+            noise_sd = np.sqrt(_apparatus_variance(history['StdDevScore'].to_numpy(), history['CompetitionsCount'].to_numpy()))
+        entries.append((event, entered, means[entered], noise_sd, bootstrap))
+    if not entries:
+        raise ValueError('no athlete has a predicted score on any event')
+    return df, entries
+
+
+def monte_carlo(df, n_simulations=1000, seed=None, n_workers=1, noise_model='fixed', scores=None, prior_strength=3, progress=None):
     """
-    list_of_events = ['BB', 'VT', 'FX', 'UB']
+    This function allows users to run Monte Carlo simulations to see the expected medal count of each gymnast. Every event of both disciplines in df is simulated in one batched pass
 
-    num_simulations = 1000
+    Args:
+        df: dataframe
+        n_simulations: number of simulations to run
+        seed: seed for reproducible results, the same seed gives the same medal counts for any n_workers
+        n_workers: number of worker processes to split the simulations across, None uses every core
+        noise_model: 'fixed' adds normal noise with standard deviation 0.1 to every score.
+            'normal' uses each athlete's own StdDevScore, shrunk toward the apparatus variance when they have few competitions, and needs query_pivoted_database(include_spread=True).
+            'bootstrap' resamples each athlete's real scores and falls back to 'normal' noise for athletes without history
+        scores: dataframe from query_athlete_scores for 'bootstrap', queried when not given
+        prior_strength: number of competitions the apparatus variance is worth when shrinking
+        progress: optional callable called with the fraction of simulations done
 
-    df['gold'] = 0
-    df['silver'] = 0
-    df['bronze'] = 0
+    Returns:
+        dataframe
+    """
+    df, entries = _simulation_events(df, noise_model, scores, prior_strength)
+    athlete_keys, athlete_ids = pd.factorize(df['AthleteID']) #medals are credited to athlete positions, not matched by name
+    stacked = _stack_events(entries)
+    keys = np.full(stacked[0].shape, -1, dtype=np.intp)
+    for e, (_, entered, _, _, _) in enumerate(entries):
+        keys[e, :len(entered)] = athlete_keys[entered]
+    events = (stacked, keys)
 
-    for i in range(num_simulations): 
-        for event in list_of_events:
-            event_data = df[df[f'{event}_PredictedScore'].notna()].copy() #only select data that is the specific event type
-            event_data['simulated_score'] = event_data[f'{event}_PredictedScore'] + np.random.normal(0, 0.1, size=len(event_data)) #add noise to create simulated score
-            event_data = event_data.sort_values(by='simulated_score', ascending=False).reset_index(drop=True) #sort simulated scores from highest to lowest
+    medals = _run_chunks(events, len(athlete_ids), n_simulations, seed, n_workers, progress=progress)
 
-            #award medals to top three scorers in simulated score
-            df.loc[df['LastName'] == event_data.loc[0, 'LastName'], 'gold'] += 1
-            df.loc[df['LastName'] == event_data.loc[1, 'LastName'], 'silver'] += 1
-            df.loc[df['LastName'] == event_data.loc[2, 'LastName'], 'bronze'] += 1
+    df['gold'] = medals[athlete_keys, 0]
+    df['silver'] = medals[athlete_keys, 1]
+    df['bronze'] = medals[athlete_keys, 2]
 
     final_results = df.sort_values(by=['gold', 'silver', 'bronze'], ascending=False) #sort by medal count
     print(final_results)
     return (final_results)
 
 
+def wilson_interval(successes, n, confidence=0.95):
+    """
+    This function gives the Wilson score interval of binomial proportions, which unlike the normal approximation stays inside [0, 1] and does not collapse to a width of 0 for probabilities near 0 or 1
+
+    Args:
+        successes: array of success counts
+        n: number of trials
+        confidence: coverage of the interval
+
+    Returns:
+        (low, high) arrays
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = np.asarray(successes, dtype=float) / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half_width = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return center - half_width, center + half_width
+
+
+def adaptive_monte_carlo(df, precision=0.01, confidence=0.95, seed=None, block_size=1_000, min_simulations=1_000, max_simulations=1_000_000,
+                         noise_model='fixed', scores=None, prior_strength=3, progress=None):
+    """
+    This function runs the apparatus finals of monte_carlo in blocks of simulations until every podium contender's medal probabilities are known to the requested precision.
+    A contender is an athlete who reached the podium of the event at least once. Clear favourites stop after a few blocks, close medal races run longer
+
+    Args:
+        df: dataframe
+        precision: largest half-width of the Wilson intervals of the contenders' gold, silver, bronze and medal probabilities
+        confidence: coverage of the intervals
+        seed: seed for reproducible results
+        block_size: number of simulations between two precision checks
+        min_simulations: number of simulations run before the first check
+        max_simulations: number of simulations after which the run stops whatever the precision
+        noise_model: 'fixed', 'normal' or 'bootstrap', see monte_carlo
+        scores: dataframe from query_athlete_scores for 'bootstrap', queried when not given
+        prior_strength: number of competitions the apparatus variance is worth when shrinking
+        progress: optional callable called with the fraction of max_simulations done
+
+    Returns:
+        (dataframe with one row per athlete and event: the probabilities of 'gold', 'silver', 'bronze' and any 'medal' with their '_low' and '_high' bounds,
+        number of simulations run)
+    """
+    df, entries = _simulation_events(df, noise_model, scores, prior_strength)
+    stacked = _stack_events(entries)
+    medals = [np.zeros((len(entered), 3), dtype=np.int64) for _, entered, _, _, _ in entries]
+    seed_sequence = np.random.SeedSequence(seed)
+    n = 0
+
+    while n < max_simulations:
+        size = min(block_size, max_simulations - n)
+        rng = np.random.default_rng(seed_sequence.spawn(1)[0]) #every block has its own stream, so the draws do not depend on when the run stops
+        podiums = _batched_podiums(stacked, size, rng)
+        for e, ((_, entered, _, _, _), tally) in enumerate(zip(entries, medals)):
+            tally += _tally_podiums(np.where(podiums[:, e] < len(entered), podiums[:, e], -1), len(entered))
+        n += size
+        if progress is not None:
+            progress(n / max_simulations)
+        if n < min_simulations:
+            continue
+
+        counts = np.concatenate(medals)
+        contenders = counts.sum(axis=1) > 0
+        counts = np.column_stack([counts, counts.sum(axis=1)])[contenders] #an athlete wins at most one medal per event
+        low, high = wilson_interval(counts, n, confidence)
+        if (high - low).max(initial=0) / 2 <= precision:
+            break
+
+    rows = []
+    for (event, entered, _, _, _), tally in zip(entries, medals):
+        results = df.iloc[entered][['LastName', 'FirstName', 'Country']].reset_index(drop=True)
+        results['Event'] = event
+        for medal, count in zip(['gold', 'silver', 'bronze', 'medal'], [*tally.T, tally.sum(axis=1)]):
+            results[medal] = count / n
+            results[f'{medal}_low'], results[f'{medal}_high'] = wilson_interval(count, n, confidence)
+        rows.append(results)
+    results = pd.concat(rows, ignore_index=True).sort_values(by=['medal', 'gold'], ascending=False).reset_index(drop=True)
+    return results, n
+
+
+def _noise_sd_matrix(df, events, noise_model, prior_strength):
+    """
+    This function gives the noise of every athlete on every apparatus for the field simulations
+
+    Args:
+        df: dataframe from query_pivoted_database
+        events: apparatus to simulate
+        noise_model: 'fixed' or 'normal', see monte_carlo
+        prior_strength: number of competitions the apparatus variance is worth when shrinking
+
+    Returns:
+        (n_athletes, n_events) array of standard deviations
+    """
+    if noise_model == 'fixed':
+        return np.full((len(df), len(events)), 0.1)
+    if noise_model != 'normal':
+        raise ValueError(f"noise_model must be 'fixed' or 'normal', not {noise_model!r}")
+    if any(f'{event}_StdDevScore' not in df.columns for event in events):
+        raise ValueError("noise_model='normal' needs the columns of query_pivoted_database(include_spread=True)")
+    return np.column_stack([
+        _shrunk_noise_sd(df[f'{event}_StdDevScore'].to_numpy(dtype=float), df[f'{event}_CompetitionsCount'].to_numpy(dtype=float), prior_strength)
+        for event in events
+    ])
+
+
+def _placings(totals):
+    """
+    This function ranks the competitors of every simulation, the highest total first
+
+    Args:
+        totals: (num_simulations, n_competitors) array of simulated totals
+
+    Returns:
+        (num_simulations, n_competitors) array of competitor positions in finishing order, and the matching array of every competitor's rank starting at 1
+    """
+    order = np.argsort(-totals, axis=1) #ties have probability 0 with continuous noise, so the faster unstable sort is fine
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1, totals.shape[1] + 1), order.shape), axis=1)
+    return order, ranks
+
+
+def _run_field_chunks(simulate_totals, num_competitors, n_simulations, seed, chunk_size=SIMULATION_CHUNK_SIZE, progress=None):
+    """
+    This function runs the simulations of a team or all-around final in fixed-size chunks, every one with its own child of the seed's SeedSequence like _run_chunks
+
+    Args:
+        simulate_totals: callable taking (num_simulations, rng) and returning the (num_simulations, num_competitors) array of simulated totals
+        num_competitors: number of teams or athletes in the final
+        n_simulations: total number of simulations
+        seed: seed of the run, None for fresh entropy
+        chunk_size: number of simulations per chunk
+        progress: optional callable called with the fraction of chunks done after every chunk
+
+    Returns:
+        (num_competitors, 3) array of gold, silver and bronze counts and the 1-D array of every competitor's summed rank
+    """
+    chunk_sizes = [min(chunk_size, n_simulations - start) for start in range(0, n_simulations, chunk_size)]
+    medals = np.zeros((num_competitors, 3), dtype=np.int64)
+    rank_sums = np.zeros(num_competitors, dtype=np.int64)
+    for done, (size, seed_sequence) in enumerate(zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))), 1):
+        order, ranks = _placings(simulate_totals(size, np.random.default_rng(seed_sequence)))
+        medals += _tally_podiums(order[:, :3], num_competitors)
+        rank_sums += ranks.sum(axis=0)
+        if progress is not None:
+            progress(done / len(chunk_sizes))
+    return medals, rank_sums
+
+
+def _simulated_scores(means, noise_sd, num_simulations, rng):
+    """
+    This function draws the (num_simulations, n_athletes, n_events) tensor of simulated scores, in single precision to halve the memory traffic
+
+    Args:
+        means: (n_athletes, n_events) array of predicted scores
+        noise_sd: (n_athletes, n_events) array of standard deviations
+        num_simulations: number of simulations to draw
+        rng: numpy random Generator
+
+    Returns:
+        float32 array
+    """
+    noise = rng.standard_normal((num_simulations,) + means.shape, dtype=np.float32)
+    noise *= noise_sd.astype(np.float32)
+    noise += means.astype(np.float32)
+    return noise
+
+
+def _with_probabilities(df, medals, rank_sums, n_simulations):
+    """
+    This function turns the medal tallies and summed ranks of _run_field_chunks into probabilities and expected ranks, best expected rank first
+    """
+    df['gold'] = medals[:, 0] / n_simulations
+    df['silver'] = medals[:, 1] / n_simulations
+    df['bronze'] = medals[:, 2] / n_simulations
+    df['medal'] = medals.sum(axis=1) / n_simulations
+    df['ExpectedRank'] = rank_sums / n_simulations
+    return df.sort_values(by=['ExpectedRank', 'gold'], ascending=[True, False]).reset_index(drop=True)
+
+
+def simulate_team_final(df, n_simulations=100_000, seed=None, team_size=5, per_apparatus=3, count=3, n_teams=None, events=EVENTS,
+                        noise_model='fixed', prior_strength=3, progress=None):
+    """
+    This function simulates a team final. Every country's team is the one select_team would pick and its per_apparatus best gymnasts compete on each apparatus,
+    all simulated at once as a (n_simulations, n_gymnasts, n_events) tensor. A team total is the sum over the apparatus of the best count simulated scores of its lineup
+
+    Args:
+        df: dataframe from query_pivoted_database
+        n_simulations: number of simulations to run
+        seed: seed for reproducible results
+        team_size: number of gymnasts on a team
+        per_apparatus: number of gymnasts of a team who compete on each apparatus, 3 in the Olympic team final
+        count: number of counting scores per apparatus
+        n_teams: keep only the teams with the highest expected totals, 8 for an Olympic team final, every country with at least count gymnasts when None
+        events: apparatus of the competition
+        noise_model: 'fixed' or 'normal', see monte_carlo
+        prior_strength: number of competitions the apparatus variance is worth when shrinking
+        progress: optional callable called with the fraction of simulations done
+
+    Returns:
+        dataframe with one row per country: the 'Team', its expected 'TeamScore', the probabilities of 'gold', 'silver', 'bronze' and any 'medal', and its 'ExpectedRank'
+    """
+    if per_apparatus < count:
+        raise ValueError(f'per_apparatus ({per_apparatus}) must be at least count ({count})')
+    columns = [f'{event}_PredictedScore' for event in events]
+    df = df[df[columns].notna().any(axis=1)].reset_index(drop=True) #only gymnasts of the events' discipline
+    scores = df[columns].fillna(0).to_numpy(dtype=float)
+    noise_sd = np.where(scores > 0, _noise_sd_matrix(df, events, noise_model, prior_strength), 0)
+
+    teams = []
+    for country, roster in df.groupby('Country', sort=True):
+        roster = roster.index.to_numpy()
+        if len(roster) < count:
+            continue
+        members, _, _ = best_team(scores[roster], team_size, count)
+        members = roster[members]
+        # lineup[e]: the per_apparatus members with the best predicted scores on event e, -1 for empty places
+        lineup = np.full((len(events), per_apparatus), -1)
+        for e in range(len(events)):
+            competing = [i for i in sorted(members, key=lambda i: -scores[i, e])[:per_apparatus] if scores[i, e] > 0]
+            lineup[e, :len(competing)] = competing
+        expected = np.sort(np.where(lineup >= 0, scores[lineup, np.arange(len(events))[:, None]], 0), axis=1)[:, ::-1][:, :count].sum()
+        teams.append((country, members, lineup, expected))
+    teams.sort(key=lambda team: -team[3])
+    if n_teams is not None:
+        teams = teams[:n_teams]
+    if not teams:
+        raise ValueError(f'no country has at least {count} gymnasts')
+
+    # only the gymnasts of a lineup are simulated, the last row is an always-0 gymnast filling the empty places
+    gymnasts = np.unique(np.concatenate([team[2][team[2] >= 0] for team in teams]))
+    means = np.vstack([scores[gymnasts], np.zeros(len(events))])
+    sds = np.vstack([noise_sd[gymnasts], np.zeros(len(events))])
+    lineups = np.stack([np.where(team[2] >= 0, np.searchsorted(gymnasts, team[2]), len(gymnasts)) for team in teams]) #(n_teams, n_events, per_apparatus)
+
+    def simulate_totals(num_simulations, rng):
+        simulated = _simulated_scores(means, sds, num_simulations, rng)
+        lineup_scores = simulated[:, lineups, np.arange(len(events))[:, None]] #(num_simulations, n_teams, n_events, per_apparatus)
+        if count < per_apparatus:
+            lineup_scores = -np.partition(-lineup_scores, count - 1, axis=3)[..., :count] #drop the lowest scores
+        return lineup_scores.sum(axis=(2, 3))
+
+    medals, rank_sums = _run_field_chunks(simulate_totals, len(teams), n_simulations, seed, progress=progress)
+    results = pd.DataFrame({
+        'Country': [team[0] for team in teams],
+        'Team': [', '.join(df.loc[team[1], 'LastName']) for team in teams],
+        'TeamScore': [team[3] for team in teams],
+    })
+    return _with_probabilities(results, medals, rank_sums, n_simulations)
+
+
+def simulate_all_around(df, n_simulations=100_000, seed=None, n_finalists=None, per_country=2, events=EVENTS,
+                        noise_model='fixed', prior_strength=3, progress=None):
+    """
+    This function simulates an individual all-around final, where every gymnast's total is the sum of their simulated scores on every apparatus.
+    Only gymnasts with a predicted score on every apparatus take part
+
+    Args:
+        df: dataframe from query_pivoted_database
+        n_simulations: number of simulations to run
+        seed: seed for reproducible results
+        n_finalists: keep only the gymnasts with the highest expected totals, 24 for an Olympic final, every all-around gymnast when None
+        per_country: at most this many finalists per country when n_finalists is set, None for no limit
+        events: apparatus of the competition
+        noise_model: 'fixed' or 'normal', see monte_carlo
+        prior_strength: number of competitions the apparatus variance is worth when shrinking
+        progress: optional callable called with the fraction of simulations done
+
+    Returns:
+        dataframe with one row per gymnast: their expected 'AAScore', the probabilities of 'gold', 'silver', 'bronze' and any 'medal', and their 'ExpectedRank'
+    """
+    columns = [f'{event}_PredictedScore' for event in events]
+    df = df.reset_index(drop=True)
+    noise_sd = _noise_sd_matrix(df, events, noise_model, prior_strength)
+    field = df[df[columns].notna().all(axis=1)].copy()
+    field['AAScore'] = field[columns].sum(axis=1)
+    field = field.sort_values('AAScore', ascending=False, kind='stable')
+    if n_finalists is not None:
+        if per_country is not None:
+            field = field[field.groupby('Country').cumcount() < per_country]
+        field = field.head(n_finalists)
+    if field.empty:
+        raise ValueError('no gymnast has a predicted score on every apparatus')
+
+    means = field[columns].to_numpy(dtype=float)
+    sds = noise_sd[field.index.to_numpy()]
+
+    def simulate_totals(num_simulations, rng):
+        return _simulated_scores(means, sds, num_simulations, rng).sum(axis=2)
+
+    medals, rank_sums = _run_field_chunks(simulate_totals, len(field), n_simulations, seed, progress=progress)
+    results = field[['LastName', 'FirstName', 'Country', 'AAScore']].reset_index(drop=True)
+    return _with_probabilities(results, medals, rank_sums, n_simulations)
+
+
+def country_medal_probabilities(results):
+    """
+    This function adds up the all-around medal chances of every country's gymnasts. Only one gymnast wins each medal, so the sums of 'gold', 'silver' and 'bronze'
+    are the country's probabilities of winning them, while 'medal' is its expected number of medals
+
+    Args:
+        results: dataframe from simulate_all_around
+
+    Returns:
+        dataframe with one row per country, the country with the best gold chances first
+    """
+    by_country = results.groupby('Country')[['gold', 'silver', 'bronze', 'medal']].sum()
+    by_country['BestExpectedRank'] = results.groupby('Country')['ExpectedRank'].min()
+    return by_country.sort_values(by=['gold', 'silver', 'bronze'], ascending=False).reset_index()
+
+
+def build_baseline(df, n_simulations=1000, seed=0, progress=None):
+    """
+    This function simulates every event once for a fixed seed and keeps each simulation's podium and podium scores, so that hypothetical athletes can later be added with what_if without re-simulating the field
+
+    Args:
+        df: dataframe from query_pivoted_database
+        n_simulations: number of simulations to run
+        seed: seed of the baseline and of the hypothetical athletes' draws
+        progress: optional callable called with the fraction of events done
+
+    Returns:
+        dict with the dataframe, the per-event podiums, podium scores and medal tallies, and the seed of the hypothetical athletes' draws
+    """
+    list_of_events = pivot_events(df)
+
+    baseline_seed, what_if_seed = np.random.SeedSequence(seed).spawn(2)
+    rng = np.random.default_rng(baseline_seed)
+    df = df.drop(columns=['gold', 'silver', 'bronze'], errors='ignore').reset_index(drop=True)
+    events = {}
+
+    for event in list_of_events:
+        scores = df[f'{event}_PredictedScore'].to_numpy(dtype=float)
+        entered = np.flatnonzero(~np.isnan(scores)) #only select athletes that compete in the specific event
+        podiums = np.full((n_simulations, 3), -1, dtype=np.intp) #-1 marks a medal nobody won
+        podium_scores = np.full((n_simulations, 3), -np.inf)
+        if len(entered) > 0:
+            event_podiums, event_scores = _event_podiums(scores[entered], n_simulations, rng, return_scores=True)
+            podiums[:, :event_podiums.shape[1]] = entered[event_podiums]
+            podium_scores[:, :event_scores.shape[1]] = event_scores
+        events[event] = {
+            'podiums': podiums,
+            'podium_scores': podium_scores,
+            'medals': _tally_podiums(podiums, len(df)),
+        }
+        if progress is not None:
+            progress(len(events) / len(list_of_events))
+
+    return {'df': df, 'events': events, 'n_simulations': n_simulations, 'what_if_seed': what_if_seed}
+
+
+def pivoted_baseline(n_simulations=1000, seed=0, progress=None, data_version=None, mean_model='average', model_version=None):
+    """
+    This function builds the baseline of the whole field from query_pivoted_database once and caches it for later calls
+
+    Args:
+        n_simulations: number of simulations to run
+        seed: seed of the baseline
+        progress: optional callable called with the fraction of the baseline built, only called when the baseline is not cached yet
+        data_version: database_version() the baseline is built from, read from the database when None. Baselines of older data are never served
+        mean_model: how the field's scores are predicted, see query_pivoted_database
+        model_version: version of the predictions for mean_model='model', the latest stored when None. Baselines of an older model are never served
+
+    Returns:
+        dict from build_baseline
+    """
+    if mean_model == 'model' and model_version is None:
+        model_version = latest_model_version()
+    key = (n_simulations, seed, database_version() if data_version is None else data_version, mean_model, model_version)
+    if key not in _BASELINES:
+        baseline = build_baseline(query_pivoted_database(mean_model=mean_model, model_version=model_version), n_simulations, seed, progress)
+        if len(_BASELINES) >= BASELINE_CACHE_SIZE:
+            _BASELINES.pop(next(iter(_BASELINES))) #drop the oldest baseline
+        _BASELINES[key] = baseline
+    return _BASELINES[key]
+
+
+def clear_baselines():
+    """
+    This function drops the cached baselines of pivoted_baseline, so the next call re-reads the database
+    """
+    _BASELINES.clear()
+
+
+def medal_simulation(FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore, n_simulations=1000, seed=0, data_version=None, mean_model='average', model_version=None, progress=None):
+    """
+    This function runs what_if on the cached baseline of the whole field, it is the unit of work of the dashboard's background medal jobs
+
+    Args:
+        FirstName
+        LastName
+        Country
+        BB_PredictedScore
+        VT_PredictedScore
+        FX_PredictedScore
+        UB_PredictedScore
+        n_simulations: number of simulations of the baseline
+        seed: seed of the baseline
+        data_version: database_version() to simulate, part of the inputs so results of older data are not reused
+        mean_model: how the field's scores are predicted, see query_pivoted_database
+        model_version: version of the predictions for mean_model='model', part of the inputs so results of an older model are not reused
+        progress: optional callable called with the fraction of the work done
+
+    Returns:
+        dataframe from what_if
+    """
+    report = progress if progress is not None else (lambda fraction: None)
+    baseline = pivoted_baseline(n_simulations, seed, lambda fraction: report(0.9 * fraction), data_version, mean_model, model_version) #building the baseline is the slow part
+    report(0.9)
+    df = what_if(baseline, FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore)
+    report(1.0)
+    return df
+
+
+def what_if(baseline, FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore):
+    """
+    This function adds a hypothetical athlete to a baseline from build_baseline. Only the new athlete's scores are simulated and compared with the cached podium of every simulation, so the cost does not depend on the size of the field. The baseline itself is left untouched
+
+    Args:
+        baseline: dict from build_baseline
+        FirstName
+        LastName
+        Country
+        BB_PredictedScore
+        VT_PredictedScore
+        FX_PredictedScore
+        UB_PredictedScore
+
+    Returns:
+        dataframe with the new athlete and the medal counts of every gymnast, sorted like monte_carlo
+    """
+    predicted_scores = {'BB': BB_PredictedScore, 'VT': VT_PredictedScore, 'FX': FX_PredictedScore, 'UB': UB_PredictedScore}
+
+    df = add_user_entry(baseline['df'].copy(), FirstName, LastName, Country, BB_PredictedScore, VT_PredictedScore, FX_PredictedScore, UB_PredictedScore)
+    new_athlete = len(baseline['df'])
+    n_simulations = baseline['n_simulations']
+    rng = np.random.default_rng(baseline['what_if_seed'])
+    medals = np.zeros((len(df), 3), dtype=np.int64)
+
+    for event, cached in baseline['events'].items():
+        noise = rng.normal(0, 0.1, size=n_simulations) #drawn for every event so each event keeps its own draws
+        if predicted_scores.get(event) is None or np.isnan(predicted_scores[event]): #the hypothetical athlete only enters the women's events
+            medals[:new_athlete] += cached['medals']
+            continue
+
+        simulated_score = predicted_scores[event] + noise
+        place = (cached['podium_scores'] > simulated_score[:, None]).sum(axis=1, keepdims=True) #0 is gold, 3 is off the podium
+        medal = np.arange(3)
+        shifted = np.concatenate([cached['podiums'][:, :1], cached['podiums'][:, :-1]], axis=1) #everybody at or below the new athlete moves down one place
+        podiums = np.where(medal < place, cached['podiums'], np.where(medal == place, new_athlete, shifted))
+        medals += _tally_podiums(podiums, len(df))
+
+    df['gold'] = medals[:, 0]
+    df['silver'] = medals[:, 1]
+    df['bronze'] = medals[:, 2]
+
+    return df.sort_values(by=['gold', 'silver', 'bronze'], ascending=False) #sort by medal count
+
+
 def medal_count_by_country(df, country):
     """
     This function visualizes the athlete's who were able to win medals for their country in the simulation
@@ -85,6 +890,8 @@ def medal_count_by_country(df, country):
     Returns:
         dataframe
     """
+    from plotly import express as px
+
     results_by_country = (df[df['Country']==country]).head()
     print(results_by_country)
 
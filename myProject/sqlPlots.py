@@ -1,79 +1,330 @@
-import pandas as pd
+import argparse
+import hashlib
+import os
 import sqlite3
-maindf = pd.read_csv("data_2022_2023.csv")
-import plotly.express as px
-import plotly
-from plotly import express as px
-import plotly.io as pio
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .data import DISCIPLINES, EVENTS, dataset_version, event_key, get_results
+    from .db import get_pool, write_connection
+    from .schema import check_schema, ensure_schema
+except ImportError: #imported as a top-level module by app.py
+    from data import DISCIPLINES, EVENTS, dataset_version, event_key, get_results
+    from db import get_pool, write_connection
+    from schema import check_schema, ensure_schema
+
 
+def __getattr__(name):
+    # maindf used to be read at import time, it is now loaded on first use
+    if name == 'maindf':
+        return get_results("data_2022_2023.csv")
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-def data_cleaning(maindf):
+
+def data_cleaning(maindf, genders=None):
     """
-    This function  cleans the data by removing NA values. It also replaces apparatus values of 'VT1' and 'VT2' to be 'VT'. It only filters for women gymnasts.
+    This function  cleans the data by removing NA values. It also replaces apparatus values of 'VT1' and 'VT2' to be 'VT' and upper-cases apparatus such as 'hb', strips the spaces around names and gymnasts known by a single name get an empty FirstName. It keeps the apparatus of the DISCIPLINES registry, for women and men gymnasts.
 
     Args:
         maindf: dataframe
+        genders: disciplines to keep, every discipline of DISCIPLINES when None
 
     Returns:
         dataframe
     """
     maindf.dropna(inplace=True, subset=[ 'Apparatus', 'Score', 'Country', 'D_Score', "E_Score"]) #removing NA values
-    maindf.loc[maindf['Apparatus'] == 'VT1', 'Apparatus'] = 'VT' #replaces apparatus values of 'VT1' and 'VT2' to be 'VT'
-    maindf.loc[maindf['Apparatus'] == 'VT2', 'Apparatus'] = 'VT' #replaces apparatus values of 'VT1' and 'VT2' to be 'VT'
-    maindf = maindf[maindf['Gender'] == 'w']#women's only
-    return maindf
+    apparatus = maindf['Apparatus'].astype(str).str.upper().replace({'VT1': 'VT', 'VT2': 'VT'}) #replaces apparatus values of 'VT1' and 'VT2' to be 'VT'
+    keep = np.zeros(len(maindf), dtype=bool)
+    for gender in (DISCIPLINES if genders is None else genders):
+        keep |= ((maindf['Gender'] == gender) & apparatus.isin(DISCIPLINES[gender])).to_numpy() #drops apparatus outside the gymnast's discipline
+    if isinstance(maindf['Apparatus'].dtype, pd.CategoricalDtype):
+        apparatus = apparatus.astype('category')
+    names = {}
+    for column in ('LastName', 'FirstName', 'Country'): #the CSV has names ending in a non-breaking space, which would make two athletes of one
+        names[column] = maindf[column].str.strip()
+        if isinstance(maindf[column].dtype, pd.CategoricalDtype):
+            names[column] = names[column].astype('category')
+    names['FirstName'] = names['FirstName'].fillna('') #a few men are known by a single name
+    return maindf[keep].assign(Apparatus=apparatus[keep], **{column: values[keep] for column, values in names.items()})
 
 
-def difficultyVsExecutionPlot(maindf):
+def plot_groups(maindf, by='Event'):
     """
-    This function  is a scatterplot that shows the relationship between difficulty and execution
+    This function gives the group of every row of the plots. The default 'Event' is the event key of the row's Gender and Apparatus,
+    so men's and women's FX and VT are never fitted or coloured together and the women's groups keep the bare apparatus names
 
     Args:
         maindf: dataframe
+        by: 'Event' or a column of maindf
 
     Returns:
-        shows figure
+        Series aligned with maindf
+    """
+    if by != 'Event' or 'Event' in maindf.columns:
+        return maindf[by]
+    genders = maindf['Gender'] if 'Gender' in maindf.columns else ['w'] * len(maindf)
+    return pd.Series([event_key(gender, str(apparatus)) for gender, apparatus in zip(genders, maindf['Apparatus'])], index=maindf.index, name='Event')
+
+
+def ols_trendlines(maindf, x='D_Score', y='E_Score', by='Event'):
+    """
+    This function fits the least-squares line y = slope * x + intercept of every group in closed form from per-group sums, in one vectorized pass
+
+    Args:
+        maindf: dataframe
+        x: column of the regressor
+        y: column of the response
+        by: group, see plot_groups
+
+    Returns:
+        dataframe indexed by group with slope, intercept, r2, n, x_min, x_max
+    """
+    data = maindf[[x, y]].assign(**{by: plot_groups(maindf, by)}).dropna()
+    xs = data[x].to_numpy(dtype=float)
+    ys = data[y].to_numpy(dtype=float)
+    sums = pd.DataFrame({by: data[by].to_numpy(), 'x': xs, 'y': ys, 'xx': xs * xs, 'xy': xs * ys, 'yy': ys * ys}).groupby(by, observed=True)
+    totals = sums.sum()
+    n = sums.size()
+    sxx = totals['xx'] - totals['x'] ** 2 / n
+    sxy = totals['xy'] - totals['x'] * totals['y'] / n
+    syy = totals['yy'] - totals['y'] ** 2 / n
+    slope = sxy / sxx
+    return pd.DataFrame({
+        'slope': slope,
+        'intercept': (totals['y'] - slope * totals['x']) / n,
+        'r2': sxy ** 2 / (sxx * syy),
+        'n': n,
+        'x_min': sums['x'].min(),
+        'x_max': sums['x'].max(),
+    })
+
+
+@lru_cache(maxsize=8)
+def _dataset_trendlines(path, version):
+    return ols_trendlines(data_cleaning(get_results(path).copy(), genders=('w',)))
+
+
+def dataset_trendlines(path="data_2022_2023.csv"):
+    """
+    This function returns the per-apparatus difficulty vs execution trendlines of the cleaned dataset, fitted once per dataset version
+
+    Args:
+        path: path of the CSV
+
+    Returns:
+        dataframe, see ols_trendlines
+    """
+    return _dataset_trendlines(os.path.abspath(path), dataset_version(path))
+
+
+def downsample(maindf, max_points, by='Event', seed=0):
+    """
+    This function keeps at most about max_points rows by sampling the same fraction of every group, so the share and the density of each group are preserved
+
+    Args:
+        maindf: dataframe
+        max_points: number of rows to keep
+        by: group to stratify on, see plot_groups
+        seed: seed of the sampling
+
+    Returns:
+        dataframe
+    """
+    if len(maindf) <= max_points:
+        return maindf
+    return maindf.groupby(plot_groups(maindf, by), observed=True, group_keys=False).sample(frac=max_points / len(maindf), random_state=seed)
+
+
+def bin_points(maindf, bin_width=0.1, x='D_Score', y='E_Score', by='Event'):
+    """
+    This function aggregates the points of every group into a grid of bin_width squares
+
+    Args:
+        maindf: dataframe
+        bin_width: size of a bin on both axes
+        x: column of the horizontal axis
+        y: column of the vertical axis
+        by: group, see plot_groups
+
+    Returns:
+        dataframe with by, x, y at the center of each non-empty bin and its Count
+    """
+    data = maindf[[x, y]].assign(**{by: plot_groups(maindf, by)}).dropna()
+    cells = pd.DataFrame({
+        by: data[by].to_numpy(),
+        x: (np.floor(data[x].to_numpy(dtype=float) / bin_width) + 0.5) * bin_width,
+        y: (np.floor(data[y].to_numpy(dtype=float) / bin_width) + 0.5) * bin_width,
+    })
+    return cells.groupby([by, x, y], observed=True).size().rename('Count').reset_index()
+
+
+def difficultyVsExecutionPlot(maindf=None, max_points=20_000, binned=False, bin_width=0.1, show=True):
+    """
+    This function  is a scatterplot that shows the relationship between difficulty and execution.
+    The trendlines are fitted in closed form on every row and the points are drawn with WebGL. Points and trendlines are grouped by event, see plot_groups. Above max_points rows the points are downsampled per event,
+    or aggregated into bins when binned is True
+
+    Args:
+        maindf: dataframe, the cleaned women's dataset when None (its trendlines are then cached per dataset version)
+        max_points: number of points drawn before downsampling, None to draw every point
+        binned: draw bins sized by their number of routines instead of sampled points
+        bin_width: size of a bin on both axes
+        show: show the figure
+
+    Returns:
+        figure
     """
-    fig = px.scatter(maindf,  #scatterplot that shows the relationship between difficulty and execution
-                  x="D_Score", 
-                  y="E_Score", 
-                  color="Apparatus", 
-                  hover_data=['LastName', 'FirstName'],
-                  title="Difficulty vs Execution Tradeoff Across Apparatuses",
-                  trendline="ols")
+    from plotly import express as px
+    from plotly import graph_objects as go
+
+    if maindf is None:
+        maindf = data_cleaning(get_results("data_2022_2023.csv").copy(), genders=('w',))
+        trendlines = dataset_trendlines("data_2022_2023.csv")
+    else:
+        trendlines = ols_trendlines(maindf)
+    maindf = maindf.assign(Event=plot_groups(maindf))
+
+    events = [str(event) for event in trendlines.index]
+    colors = {event: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, event in enumerate(events)}
+    labels = dict(category_orders={'Event': events}, color_discrete_map=colors, render_mode='webgl')
+
+    if binned and max_points is not None and len(maindf) > max_points:
+        bins = bin_points(maindf, bin_width)
+        fig = px.scatter(bins, x="D_Score", y="E_Score", color="Event", size="Count", hover_data=['Count'],
+                  title="Difficulty vs Execution Tradeoff Across Apparatuses", **labels)
+    else:
+        points = downsample(maindf, max_points) if max_points is not None else maindf
+        fig = px.scatter(points,  #scatterplot that shows the relationship between difficulty and execution
+                      x="D_Score", 
+                      y="E_Score", 
+                      color="Event", 
+                      hover_data=['LastName', 'FirstName'],
+                      title="Difficulty vs Execution Tradeoff Across Apparatuses",
+                      **labels)
+
+    for event, line in zip(events, trendlines.itertuples()):
+        x = np.array([line.x_min, line.x_max])
+        fig.add_trace(go.Scattergl(x=x, y=line.slope * x + line.intercept, mode='lines', name=event, legendgroup=event, showlegend=False,
+                                   line=dict(color=colors[event]), hovertext=f"OLS trendline<br>E_Score = {line.slope:.3f} * D_Score + {line.intercept:.3f}<br>R² = {line.r2:.3f}"))
 
     fig.update_layout(
         xaxis_title="Average Difficulty Score (D_Score)", 
         yaxis_title="Average Execution Score (E_Score)",
-        legend_title="Apparatus",
+        legend_title="Event",
     )
 
-    fig.show()
-    
-def query_gym_country_database(country):
+    if show:
+        fig.show()
+    return fig
+
+def ensure_indexes(database='gym'):
+    """
+    This function creates the covering indexes of a raw gym table and runs ANALYZE so the query planner can use them. Once gym is the view over the normalized tables, whose indexes come with the schema, it only runs ANALYZE. It is safe to call more than once
+
+    Args:
+        database: path of the SQLite database
+
+    Returns:
+        None
+    """
+    with write_connection(database) as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'gym'").fetchone() is not None:
+            # filter on Country, then group by athlete and apparatus without a full scan
+            conn.execute('''
+            CREATE INDEX IF NOT EXISTS gym_country_athlete_apparatus
+            ON gym (Country, LastName, FirstName, Apparatus, Score, Date)
+            ''')
+            # group every athlete and apparatus in index order instead of sorting the table
+            conn.execute('''
+            CREATE INDEX IF NOT EXISTS gym_athlete_apparatus
+            ON gym (LastName, FirstName, Apparatus, Score, Date, Country)
+            ''')
+        conn.execute('ANALYZE')
+
+
+def normalize_database(database='gym'):
+    """
+    This function migrates a database whose gym is still a table, or whose summaries are from an older schema version, to the current schema, then compacts the file and switches it to WAL mode for concurrent readers.
+    It is the only step that migrates, reads raise schema.SchemaOutdated until it ran. From the repository root:
+
+        python -m myProject.sqlPlots --database gym
+
+    Args:
+        database: path of the SQLite database
+
+    Returns:
+        None
+    """
+    with write_connection(database, wal=True) as conn:
+        ensure_schema(conn)
+    conn = sqlite3.connect(database, isolation_level=None) #VACUUM cannot run inside a transaction
+    try:
+        conn.execute('VACUUM')
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+
+def database_version(database='gym'):
+    """
+    This function returns a number that grows every time myProject.ingest loads new results, for keying caches of anything derived from the database
+
+    Args:
+        database: path of the SQLite database
+
+    Returns:
+        int
+    """
+    return int(get_pool(database, check=check_schema).query('SELECT COALESCE(MAX(ingest_id), 0) AS version FROM ingests')['version'].iloc[0])
+
+
+def query_gym_country_database(country, database='gym'):
     """
     This function  connects to the SQL database to filter by a particular country and add values called the 'PredictedScore' and 'StdDevScore' and 'CompetitionsCount'
 
     Args:
         country
+        database: path of the SQLite database
 
     Returns:
         returns df
     """
-    with sqlite3.connect('gym') as conn: #  connects to the SQL database to filter by a particular country and add values called the 'PredictedScore' and 'StdDevScore' and 'CompetitionsCount'
-        cmd = \
-        f'''
-        SELECT LastName, FirstName, Apparatus, AVG(Score) AS PredictedScore, MAX(Score) as Maxscore, 
-        SQRT(AVG(score * score) - AVG(score) * AVG(score)) AS StdDevScore,
-        COUNT(DISTINCT Date) AS CompetitionsCount
-        FROM gym 
-        WHERE Country = '{country}'
-        GROUP BY LastName, FirstName, Apparatus 
-        ORDER BY Apparatus, Maxscore DESC
-        '''
-    df = pd.read_sql_query(cmd, conn)
+    # reads the athlete_apparatus_stats summary, so the cost depends on the number of athletes and not on the number of results
+    # bound parameter instead of formatting the country into the SQL, so the statement is cached and cannot be injected
+    cmd = \
+    '''
+    SELECT LastName, FirstName, Apparatus, sum_score / n AS PredictedScore, max_score as Maxscore, 
+    SQRT(m2 / n) AS StdDevScore,
+    competitions AS CompetitionsCount
+    FROM athlete_apparatus_stats 
+    WHERE Country = ?
+    ORDER BY Apparatus, Maxscore DESC
+    '''
+    df = get_pool(database, check=check_schema).query(cmd, (country,))
     return (df)
 
+def summarize_scores(df, by=('LastName', 'FirstName', 'Country', 'Apparatus')):
+    """
+    This function is the pandas version of the per-athlete summary in query_gym_country_database. StdDevScore is the population standard deviation from pandas' one-pass Welford groupby, so it stays accurate for scores with small spreads
+
+    Args:
+        df: dataframe of individual results with a 'Score' and a 'Date' column
+        by: columns to group by
+
+    Returns:
+        dataframe with 'PredictedScore', 'StdDevScore' and 'CompetitionsCount' per group
+    """
+    grouped = df.groupby(list(by), observed=True, sort=False)
+    return pd.DataFrame({
+        'PredictedScore': grouped['Score'].mean(),
+        'StdDevScore': grouped['Score'].std(ddof=0),
+        'CompetitionsCount': grouped['Date'].nunique(),
+    }).reset_index()
+
+
 def scatterplot_of_country(country):
     """
     This function shows a scatterplot of the gymnast's predicted score. 
@@ -84,6 +335,8 @@ def scatterplot_of_country(country):
     Returns:
         shows figure
     """
+    from plotly import express as px
+
     fig = px.scatter(query_gym_country_database(country), # shows a scatterplot of the gymnast's predicted score. 
                 x = "Apparatus", 
                 y = "PredictedScore", 
@@ -99,45 +352,208 @@ def scatterplot_of_country(country):
 
     fig.show()
 
-def query_pivoted_database():
+def athlete_id(LastName, FirstName, Country, Gender='w'):
+    """
+    This function builds a stable integer ID for an athlete from the same name, country and gender that identify them in the athletes table,
+    so that athletes who share a surname are never mixed up and every row of query_pivoted_database gets its own ID
+
+    Args:
+        LastName
+        FirstName
+        Country
+        Gender: key of DISCIPLINES
+
+    Returns:
+        int
+    """
+    key = '\x1f'.join(str(part) for part in (LastName, FirstName, Country, Gender)) #exact values, the pivot groups on them as stored
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> 1 #drop one bit so the ID fits in a signed 64-bit integer
+
+
+def add_athlete_ids(df):
+    """
+    This function adds an 'AthleteID' column built from each row's LastName, FirstName, Country and Gender, women's when df has no 'Gender' column
+
+    Args:
+        df: dataframe
+
+    Returns:
+        dataframe
+    """
+    genders = df['Gender'] if 'Gender' in df.columns else ['w'] * len(df)
+    ids = [athlete_id(*athlete) for athlete in zip(df['LastName'], df['FirstName'], df['Country'], genders)]
+    df.insert(0, 'AthleteID', pd.Series(ids, index=df.index, dtype='int64'))
+    return df
+
+
+def latest_model_version(database='gym'):
+    """
+    This function returns the model version whose predictions were stored last
+
+    Args:
+        database: path of the SQLite database
+
+    Returns:
+        str, None when no predictions are stored
+    """
+    df = get_pool(database, check=check_schema).query('SELECT model_version FROM prediction_runs ORDER BY created_at DESC, rowid DESC LIMIT 1')
+    return df['model_version'].iloc[0] if len(df) else None
+
+
+def query_pivoted_database(database='gym', include_spread=False, mean_model='average', model_version=None):
     """
     This function  connects to the SQL database to pivot it, meaning to transform the data from along form table to a wide form table. Achieving this will allow us to consolidate multiple rows of athlete’s scores across different events into just one row with the best scores of each event in each column. 
 
     Args:
-        None
+        database: path of the SQLite database
+        include_spread: also add each event's 'StdDevScore' and 'CompetitionsCount' columns, used by the per-athlete noise models of monte_carlo
+        mean_model: 'average' predicts each event with the athlete's average score.
+            'model' uses the scores predicted by the Gymnastics network (myProject.model.refresh_predictions), falling back to the average for rows it has no prediction for
+            'form' uses the recency-weighted rating of athlete_apparatus_form, where a score's weight halves every schema.FORM_HALF_LIFE_DAYS, falling back to the average for athletes without dated results
+        model_version: version of the predictions for mean_model='model', the latest stored when None
 
     Returns:
-        df
+        df with one row per athlete, a 'Gender' column, one '<event>_PredictedScore' column per event of data.EVENTS present in the database
+        (women's 'BB', men's 'm_FX', ...) and a stable 'AthleteID' column
     """
-    with sqlite3.connect('gym') as conn: # connects to the SQL database to pivot it, meaning to transform the data from along form table to a wide form table. Achieving this will allow us to consolidate multiple rows of athlete’s scores across different events into just one row with the best scores of each event in each column. 
+    # connects to the SQL database to pivot it, meaning to transform the data from along form table to a wide form table. Achieving this will allow us to consolidate multiple rows of athlete’s scores across different events into just one row with the best scores of each event in each column. 
+    # reads the athlete_apparatus_stats summary instead of re-aggregating every result
+    if mean_model not in ('average', 'model', 'form'):
+        raise ValueError(f"mean_model must be 'average', 'model' or 'form', not {mean_model!r}")
+    mean = 'sum_score / n'
+    source = 'athlete_apparatus_stats AS s'
+    params = ()
+    if mean_model == 'model':
+        model_version = model_version or latest_model_version(database)
+        if model_version is None:
+            raise ValueError('no predicted scores are stored, run myProject.model.refresh_predictions first')
+        mean = 'COALESCE(p.PredictedScore, sum_score / n)'
+        source = '''athlete_apparatus_stats AS s
+    LEFT JOIN predicted_scores AS p
+        ON p.model_version = ? AND p.Country = s.Country AND p.LastName = s.LastName AND p.FirstName = s.FirstName
+        AND p.Gender = s.Gender AND p.Apparatus = s.Apparatus'''
+        params = (model_version,)
+    elif mean_model == 'form':
+        mean = 'COALESCE(f.decayed_sum / f.decayed_weight, sum_score / n)'
+        source = '''athlete_apparatus_stats AS s
+    LEFT JOIN athlete_apparatus_form AS f
+        ON f.Country = s.Country AND f.LastName = s.LastName AND f.FirstName = s.FirstName
+        AND f.Gender = s.Gender AND f.Apparatus = s.Apparatus'''
+    pool = get_pool(database, check=check_schema)
+    present = set(pool.query('SELECT DISTINCT Gender, Apparatus FROM athlete_apparatus_stats').itertuples(index=False, name=None))
+    events = [(gender, apparatus) for gender, apparatuses in DISCIPLINES.items() for apparatus in apparatuses if (gender, apparatus) in present]
+    # one column per event of the registry found in the data, women's and men's in the same pass
+    columns = ['s.LastName AS LastName', 's.FirstName AS FirstName', 's.Country AS Country', 's.Gender AS Gender']
+    for gender, apparatus in events:
+        condition = f"s.Gender = '{gender}' AND s.Apparatus = '{apparatus}'"
+        key = event_key(gender, apparatus)
+        columns.append(f"MAX(CASE WHEN {condition} THEN {mean} END) AS {key}_PredictedScore")
+        if include_spread:
+            columns.append(f"MAX(CASE WHEN {condition} THEN SQRT(m2 / n) END) AS {key}_StdDevScore")
+            columns.append(f"MAX(CASE WHEN {condition} THEN competitions END) AS {key}_CompetitionsCount")
+    separator = ',\n        '
+    cmd = f'''
+    SELECT 
+        {separator.join(columns)}
+      
+    FROM {source}
+    GROUP BY s.LastName, s.FirstName, s.Country, s.Gender
+    ORDER BY s.LastName, s.FirstName, s.Country, s.Gender
+    '''
 
-        cmd = f'''
-        WITH AthleteScores AS (
-            SELECT 
-                LastName, 
-                FirstName,
-                Apparatus,
-                AVG(Score) AS PredictedScore,
-                COUNT(DISTINCT Date) AS CompetitionsCount,
-                Country
-            FROM gym 
-            GROUP BY LastName, FirstName, Apparatus
-        )
-        SELECT 
-            LastName, 
-            FirstName,
-            Country,
-            MAX(CASE WHEN Apparatus = 'BB' THEN PredictedScore END) AS BB_PredictedScore,
-            MAX(CASE WHEN Apparatus = 'VT' THEN PredictedScore END) AS VT_PredictedScore,
-            MAX(CASE WHEN Apparatus = 'FX' THEN PredictedScore END) AS FX_PredictedScore,
-            MAX(CASE WHEN Apparatus = 'UB' THEN PredictedScore END) AS UB_PredictedScore
-          
-        FROM AthleteScores
-        GROUP BY LastName, FirstName, Country
-        ORDER BY LastName, FirstName, Country
-        '''
-
-        df = pd.read_sql_query(cmd, conn)
+    df = pool.query(cmd, params)
     
-    return df
+    return add_athlete_ids(df)
+
+
+def pivot_events(df):
+    """
+    This function lists the events of a pivoted database, in the order of the DISCIPLINES registry
+
+    Args:
+        df: dataframe from query_pivoted_database
+
+    Returns:
+        list of event keys
+    """
+    return [event for event in EVENTS if f'{event}_PredictedScore' in df.columns]
+
+
+def query_model_features(database='gym'):
+    """
+    This function averages the inputs of the Gymnastics network for every athlete and apparatus with a score, the rows of athlete_apparatus_stats
+
+    Args:
+        database: path of the SQLite database
+
+    Returns:
+        df with 'Country', 'LastName', 'FirstName', 'Gender', 'Apparatus', 'E_Score', 'D_Score' and 'Rank' columns
+    """
+    cmd = '''
+    SELECT a.Country, a.LastName, a.FirstName, a.Gender, r.Apparatus,
+           AVG(r.E_Score) AS E_Score, AVG(r.D_Score) AS D_Score, AVG(r.Rank) AS Rank
+    FROM results AS r
+    JOIN athletes AS a ON a.athlete_id = r.athlete_id
+    WHERE r.Score IS NOT NULL
+    GROUP BY r.athlete_id, r.Apparatus
+    '''
+    return get_pool(database, check=check_schema).query(cmd)
+
+
+def query_athlete_scores(database='gym'):
+    """
+    This function returns every individual score of every athlete, used to bootstrap simulated scores from an athlete's real results
+
+    Args:
+        database: path of the SQLite database
+
+    Returns:
+        df with 'LastName', 'FirstName', 'Country', 'Gender', 'Apparatus', 'Date' and 'Score' columns
+    """
+    cmd = '''
+    SELECT LastName, FirstName, Country, Gender, Apparatus, Date, Score
+    FROM gym
+    WHERE Score IS NOT NULL
+    '''
+    return get_pool(database, check=check_schema).query(cmd)
+
+
+def query_scores_between(start, end, country=None, database='gym'):
+    """
+    This function returns the scores of the competitions that started within a date window, using the parsed dates of the competitions table
+
+    Args:
+        start: first day of the window, 'YYYY-MM-DD'
+        end: last day of the window, 'YYYY-MM-DD'
+        country: optional country to filter on
+        database: path of the SQLite database
+
+    Returns:
+        df with 'LastName', 'FirstName', 'Country', 'Competition', 'StartDate', 'EndDate', 'Round', 'Apparatus' and 'Score' columns
+    """
+    cmd = '''
+    SELECT a.LastName, a.FirstName, a.Country, c.Competition, c.StartDate, c.EndDate, r.Round, r.Apparatus, r.Score
+    FROM competitions AS c
+    JOIN results AS r ON r.competition_id = c.competition_id
+    JOIN athletes AS a ON a.athlete_id = r.athlete_id
+    WHERE c.StartDate BETWEEN ? AND ?
+    '''
+    params = [str(start), str(end)]
+    if country is not None:
+        cmd += ' AND a.Country = ?'
+        params.append(country)
+    cmd += ' ORDER BY c.StartDate, a.Country, a.LastName'
+    return get_pool(database, check=check_schema).query(cmd, tuple(params))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrates the gym database to the current schema, see normalize_database')
+    parser.add_argument('--database', default='gym', help='SQLite database to migrate')
+    args = parser.parse_args()
+    normalize_database(args.database)
+    print(f'{args.database} is on the current schema')
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import numpy as np
+
+try:
+    from .data import discipline_events
+    from .sqlPlots import query_pivoted_database
+except ImportError: #imported as a top-level module by app.py
+    from data import discipline_events
+    from sqlPlots import query_pivoted_database
+
+EVENTS = discipline_events('w') #women's events, discipline_events('m') for the men's team
+
+
+def team_score(scores, members, count=3):
+    """
+    This function scores a team: on every apparatus the best count scores of its members are added up, a member without a score on an apparatus adds nothing
+
+    Args:
+        scores: (n_athletes, n_events) array of predicted scores, 0 for missing
+        members: list of athlete positions
+        count: number of counting scores per apparatus
+
+    Returns:
+        float
+    """
+    team = np.sort(scores[list(members)], axis=0)[::-1]
+    return float(team[:count].sum())
+
+
+def _dominated(scores, team_size):
+    """
+    This function finds the athletes that can never be needed: an athlete is left out once team_size others score at least as well on every apparatus,
+    since one of them is always outside the team and can take their place without lowering the team score. Ties are broken by position so equal athletes do not remove each other
+
+    Args:
+        scores: (n_athletes, n_events) array
+        team_size: number of gymnasts on a team
+
+    Returns:
+        boolean array, True for the athletes that can be left out
+    """
+    n = len(scores)
+    at_least = (scores[:, None, :] >= scores[None, :, :]).all(axis=2) #at_least[k, j]: k scores at least as well as j everywhere
+    better = (scores[:, None, :] > scores[None, :, :]).any(axis=2)
+    earlier = np.arange(n)[:, None] < np.arange(n)[None, :]
+    dominates = at_least & (better | earlier)
+    np.fill_diagonal(dominates, False)
+    return dominates.sum(axis=0) >= team_size
+
+
+def _suffix_best(scores, count):
+    """
+    This function keeps, for every starting position, the best count scores on each apparatus among the athletes from that position on
+
+    Args:
+        scores: (n_athletes, n_events) array
+        count: number of scores kept
+
+    Returns:
+        (n_athletes + 1, n_events, count) array sorted in decreasing order, padded with 0
+    """
+    n, n_events = scores.shape
+    best = np.zeros((n + 1, n_events, count))
+    for i in range(n - 1, -1, -1):
+        merged = np.concatenate([best[i + 1], scores[i][:, None]], axis=1)
+        best[i] = -np.sort(-merged, axis=1)[:, :count]
+    return best
+
+
+def best_team(scores, team_size=5, count=3):
+    """
+    This function finds the team with the highest team_score by branch and bound: athletes are added in order of their best possible contribution,
+    and a partial team is abandoned as soon as even the best remaining athletes on every apparatus could not beat the best team found so far
+
+    Args:
+        scores: (n_athletes, n_events) array of predicted scores, 0 for missing
+        team_size: number of gymnasts on a team
+        count: number of counting scores per apparatus
+
+    Returns:
+        (list of athlete positions, team score, number of partial teams explored)
+    """
+    n, n_events = scores.shape
+    if n <= team_size:
+        return list(range(n)), team_score(scores, range(n), count), 1
+
+    candidates = np.flatnonzero(~_dominated(scores, team_size)) #at least team_size athletes always remain
+    order = candidates[np.argsort(-np.sort(scores[candidates], axis=1)[:, ::-1][:, :count].sum(axis=1), kind='stable')]
+    ordered = scores[order]
+    suffix = _suffix_best(ordered, count)
+
+    # greedy start: add whoever raises the team score most
+    greedy = []
+    for _ in range(team_size):
+        remaining = [i for i in range(len(order)) if i not in greedy]
+        greedy.append(max(remaining, key=lambda i: team_score(ordered, greedy + [i], count)))
+    best_members, best = sorted(greedy), team_score(ordered, greedy, count)
+    nodes = 0
+
+    # current[e] holds the best count scores of the partial team on event e, in decreasing order
+    def search(start, members, current):
+        nonlocal best_members, best, nodes
+        nodes += 1
+        slots = team_size - len(members)
+        if slots == 0:
+            total = current.sum()
+            if total > best:
+                best, best_members = total, list(members)
+            return
+        for i in range(start, len(order) - slots + 1):
+            # bound: the partial team plus the best remaining athletes of every apparatus, chosen independently per apparatus
+            optimistic = np.sort(np.concatenate([current, suffix[i, :, :slots]], axis=1), axis=1)[:, ::-1][:, :count].sum()
+            if optimistic <= best:
+                return #later starting positions only have worse suffixes
+            extended = np.sort(np.concatenate([current, ordered[i][:, None]], axis=1), axis=1)[:, ::-1][:, :count]
+            members.append(i)
+            search(i + 1, members, extended)
+            members.pop()
+
+    search(0, [], np.zeros((n_events, 0)))
+    return [int(order[i]) for i in best_members], float(best), nodes
+
+
+def select_team(country, team_size=5, count=3, per_apparatus=4, events=EVENTS, df=None, database='gym', mean_model='average'):
+    """
+    This function picks the national team with the highest expected team score. Each apparatus counts the best count of the per_apparatus gymnasts who compete on it,
+    the default is the Olympic qualification format of 5 gymnasts, 4 up and 3 count. per_apparatus=3 gives the team final's 3 up, 3 count
+
+    Args:
+        country
+        team_size: number of gymnasts on the team
+        count: number of counting scores per apparatus
+        per_apparatus: number of gymnasts who compete on each apparatus, at least count
+        events: apparatus of the competition
+        df: dataframe from query_pivoted_database, queried when not given
+        database: path of the SQLite database
+        mean_model: how the gymnasts' scores are predicted, see query_pivoted_database
+
+    Returns:
+        dict with the 'team' rows, the expected team 'score', the 'lineups' of every apparatus as (LastName, FirstName, score) tuples in competing order,
+        and the number of partial teams 'explored'
+    """
+    if per_apparatus < count:
+        raise ValueError(f'per_apparatus ({per_apparatus}) must be at least count ({count})')
+    if df is None:
+        df = query_pivoted_database(database, mean_model=mean_model)
+    columns = [f'{event}_PredictedScore' for event in events]
+    roster = df[(df['Country'] == country) & df[columns].notna().any(axis=1)].reset_index(drop=True) #only gymnasts of the events' discipline
+    if roster.empty:
+        raise ValueError(f'no gymnasts found for {country!r}')
+    scores = roster[columns].fillna(0).to_numpy(dtype=float)
+
+    members, score, explored = best_team(scores, team_size, count)
+    team = roster.iloc[members]
+    lineups = {}
+    for e, event in enumerate(events):
+        competing = sorted(members, key=lambda i: -scores[i, e])[:per_apparatus]
+        lineups[event] = [(roster.at[i, 'LastName'], roster.at[i, 'FirstName'], float(scores[i, e])) for i in competing if scores[i, e] > 0]
+    return {'team': team, 'score': score, 'lineups': lineups, 'explored': explored}
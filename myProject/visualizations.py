@@ -1,15 +1,29 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
 
-# Load dataset
-df = pd.read_csv("data_2022_2023.csv")
-df['Country'] = df['Country'].str.strip().str.upper()  # Normalize country names
+try:
+    from .data import get_dataset, get_results
+except ImportError: #imported as a top-level module by app.py
+    from data import get_dataset, get_results
 
-def scatterplot_by_country(country):
+COLUMNS = ['LastName', 'Country', 'Apparatus', 'Score']
+
+
+def __getattr__(name):
+    # df used to be read at import time, it is now loaded on first use, country names are already normalized by the cache
+    if name == 'df':
+        return get_results("data_2022_2023.csv", columns=COLUMNS)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def scatterplot_by_country(country, filtered_data=None):
     """
     Generates a scatter plot of gymnastics scores for a given country.
+    Callers that already selected the country's rows can pass them as filtered_data.
     """
-    filtered_data = df[df['Country'] == country]
+    if filtered_data is None:
+        filtered_data = get_dataset("data_2022_2023.csv", columns=COLUMNS).country(country)
 
     # 🔹 Print debug info
     print(f"Selected Country: {country}")
@@ -39,3 +53,101 @@ def scatterplot_by_country(country):
     fig.update_traces(marker=dict(size=8))
 
     return fig
+
+
+def box_summary(data, by='Apparatus', value='Score'):
+    """
+    This function computes the box plot statistics of every group in one vectorized pass: quartiles (linear interpolation),
+    whiskers at the furthest points within 1.5 IQR of the box, and the points outside the whiskers
+
+    Args:
+        data: dataframe
+        by: column to group on
+        value: column to summarize
+
+    Returns:
+        (summary dataframe indexed by group with q1, median, q3, lowerfence, upperfence, count, outliers dataframe)
+    """
+    data = data[data[value].notna()]
+    groups = data.groupby(by, observed=True)[value]
+    quartiles = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    summary = pd.DataFrame({'q1': quartiles[0.25], 'median': quartiles[0.5], 'q3': quartiles[0.75]})
+    iqr = summary['q3'] - summary['q1']
+    low = data[by].map(summary['q1'] - 1.5 * iqr).astype(float)
+    high = data[by].map(summary['q3'] + 1.5 * iqr).astype(float)
+    inside = (data[value] >= low) & (data[value] <= high)
+
+    whiskers = data[inside].groupby(by, observed=True)[value]
+    summary['lowerfence'] = whiskers.min()
+    summary['upperfence'] = whiskers.max()
+    summary['count'] = groups.size()
+    return summary, data[~inside]
+
+
+def boxplot_by_country(country, filtered_data=None, summarized=True):
+    """
+    Generates a box plot of gymnastics scores per apparatus for a given country.
+    When summarized, the quartiles, whiskers and outliers are computed here and only those are sent to the browser,
+    instead of every score with points="all"
+    """
+    if filtered_data is None:
+        filtered_data = get_dataset("data_2022_2023.csv", columns=COLUMNS).country(country)
+
+    title = f"Gymnastics Score Distribution for {country}"
+    if not summarized:
+        fig = px.box(
+            filtered_data, 
+            x="Apparatus",
+            y="Score", 
+            color="Apparatus",
+            title=title,
+            labels={"Apparatus": "Event", "Score": "Final Score"},
+            points="all"  # Show all points (outliers included)
+        )
+    else:
+        summary, outliers = box_summary(filtered_data)
+        colors = px.colors.qualitative.Plotly
+        fig = go.Figure()
+        for i, (apparatus, row) in enumerate(summary.iterrows()):
+            color = colors[i % len(colors)] #same color for the box and its outliers, like px.box
+            fig.add_trace(go.Box(
+                x=[apparatus], q1=[row['q1']], median=[row['median']], q3=[row['q3']],
+                lowerfence=[row['lowerfence']], upperfence=[row['upperfence']],
+                name=str(apparatus), legendgroup=str(apparatus), marker_color=color,
+                hovertext=f"{int(row['count'])} scores", boxpoints=False,
+            ))
+            points = outliers[outliers['Apparatus'] == apparatus]
+            if not points.empty:
+                fig.add_trace(go.Scatter(
+                    x=[apparatus] * len(points), y=points['Score'], mode='markers',
+                    name=str(apparatus), legendgroup=str(apparatus), showlegend=False, marker_color=color,
+                    text=points['LastName'] if 'LastName' in points else None,
+                ))
+        fig.update_layout(title=title, legend_title_text="Apparatus")
+
+    # Layout adjustments for spacing & readability
+    fig.update_layout(
+        xaxis={'tickangle': -45},  # Rotate event labels for better spacing
+        xaxis_title="Event",
+        yaxis_title="Final Score",
+        margin=dict(l=40, r=40, t=60, b=120)
+    )
+
+    # Restore annotation box for explaining Box Plot
+    fig.add_annotation(
+        x=0.5, y=-0.2,
+        text="🔹 Box represents the middle 50% of scores (Q1 to Q3).<br>"
+            "🔹 Line inside the box = Median (middle score).<br>"
+            "🔹 Whiskers extend to non-outlier min/max scores.<br>"
+            "🔹 Dots outside whiskers = Outliers (exceptionally high/low scores).",
+        showarrow=False,
+        xref="paper", yref="paper",
+        font=dict(size=14, color="black"),
+        align="center",
+        bordercolor="black",
+        borderwidth=2,
+        bgcolor="white",
+        opacity=0.95
+    )
+
+    return fig
@@ -0,0 +1,48 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) #so myProject imports as a package when pytest is run from anywhere
+
+from myProject.db import close_pools
+from myProject.sqlPlots import normalize_database
+
+
+@pytest.fixture
+def raw_database(tmp_path):
+    """
+    This fixture copies the repository's gym database as it is checked in, so no test ever writes to the real one
+
+    Returns:
+        str, path of the copy
+    """
+    path = tmp_path / 'gym'
+    shutil.copyfile(os.path.join(ROOT, 'gym'), path)
+    yield str(path)
+    close_pools() #the pools are cached per path, release the copy's connections
+
+
+@pytest.fixture
+def database(raw_database):
+    """
+    This fixture migrates the copy of the gym database once, like python -m myProject.sqlPlots does
+
+    Returns:
+        str, path of the migrated copy
+    """
+    normalize_database(raw_database)
+    return raw_database
+
+
+@pytest.fixture
+def results_csv():
+    """
+    This fixture gives the results CSV shipped with the repository, which adds rows the gym database does not have yet
+
+    Returns:
+        str, path of the CSV
+    """
+    return os.path.join(ROOT, 'data_2022_2023.csv')
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from myProject.simulations import adaptive_monte_carlo, wilson_interval
+
+Z = 1.959963984540054 #two-sided 95% normal quantile
+
+
+def field(scores):
+    return pd.DataFrame({
+        'LastName': [f'ATHLETE{i}' for i in range(len(scores))],
+        'FirstName': 'Test',
+        'Country': 'USA',
+        'Gender': 'w',
+        'BB_PredictedScore': scores,
+    })
+
+
+def test_wilson_interval_at_the_bounds():
+    low, high = wilson_interval(np.array([0, 10]), 10)
+    assert low[0] == pytest.approx(0, abs=1e-12) and high[0] == pytest.approx(Z ** 2 / (10 + Z ** 2))
+    assert low[1] == pytest.approx(10 / (10 + Z ** 2)) and high[1] == pytest.approx(1)
+    low, high = wilson_interval(np.array([50]), 100)
+    assert low[0] + high[0] == pytest.approx(1) #symmetric around 0.5
+
+
+def test_a_certain_podium_stops_at_the_first_check():
+    results, n = adaptive_monte_carlo(field([15.0, 14.0, 13.0, 12.0]), precision=0.01, seed=0, max_simulations=100_000)
+    assert n == 1_000
+    assert results.set_index('LastName').loc['ATHLETE0', 'gold'] == 1
+
+
+def test_an_open_podium_runs_until_the_intervals_are_narrow():
+    precision = 0.02
+    results, n = adaptive_monte_carlo(field([13.5, 13.48, 13.45, 13.4, 13.3]), precision=precision, seed=0, max_simulations=100_000)
+    assert 1_000 < n < 100_000
+    for medal in ['gold', 'silver', 'bronze', 'medal']:
+        assert ((results[f'{medal}_high'] - results[f'{medal}_low']) / 2 <= precision).all()
+        assert ((results[f'{medal}_low'] <= results[medal]) & (results[medal] <= results[f'{medal}_high'])).all()
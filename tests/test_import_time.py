@@ -0,0 +1,46 @@
+"""
+Import-time budgets. Each import runs in a fresh interpreter under `python -X importtime`, so modules already imported
+by the test session do not hide its cost, and fails when it takes longer than its budget or pulls in a module it
+should not need yet.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (statement, budget in milliseconds, top-level modules that must not be imported)
+# pyarrow is not forbidden after pandas, recent pandas versions import it themselves
+CHECKS = [
+    ('import myProject', 10, ['pandas', 'numpy', 'plotly', 'pyarrow', 'sqlite3', 'dash', 'torch']),
+    ('import myProject.simulations', 1000, ['plotly', 'dash', 'torch']),
+    ('import myProject.app', 3000, ['torch']),
+]
+
+
+def import_profile(statement):
+    """
+    Returns the cumulative import time of the myProject modules in milliseconds and the set of imported top-level modules
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True, cwd=ROOT)
+    project_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name.split('.')[0] == 'myProject':
+            project_us = max(project_us, int(cumulative_us))
+        modules.add(name.split('.')[0])
+    return project_us / 1000, modules
+
+
+@pytest.mark.parametrize('statement, budget_ms, forbidden', CHECKS, ids=[statement for statement, _, _ in CHECKS])
+def test_import_time(statement, budget_ms, forbidden):
+    import_profile(statement) #the first run may compile the bytecode, only the second one is timed
+    elapsed_ms, modules = import_profile(statement)
+    assert not sorted(set(forbidden) & modules), f'{statement} imported {sorted(set(forbidden) & modules)}'
+    assert elapsed_ms <= budget_ms, f'{statement} took {elapsed_ms:.1f} ms, the budget is {budget_ms} ms'
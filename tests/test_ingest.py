@@ -0,0 +1,16 @@
+import sqlite3
+
+from myProject.ingest import ingest_csv
+
+
+def results_count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+def test_ingest_is_idempotent(database, results_csv):
+    counts = ingest_csv(results_csv, database, chunk_size=5_000) #several chunks, rows repeated across chunks are skipped too
+    assert counts['inserted'] > 0
+    count = results_count(database)
+    assert ingest_csv(results_csv, database)['inserted'] == 0
+    assert results_count(database) == count
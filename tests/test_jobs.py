@@ -0,0 +1,46 @@
+import os
+import time
+
+from myProject.jobs import JobManager, JobStore
+
+
+def crash(progress=None):
+    os._exit(1) #the worker dies without reporting, like an out-of-memory kill
+
+
+def double(value, progress=None):
+    return 2 * value
+
+
+def wait_for(jobs, key, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = jobs.status(key)
+        if state['status'] not in ('queued', 'running'):
+            return state
+        time.sleep(0.05)
+    raise AssertionError(f'job {key} still {state["status"]} after {timeout} s')
+
+
+def test_a_dead_worker_fails_its_job(tmp_path):
+    jobs = JobManager(str(tmp_path / 'jobs.sqlite'))
+    try:
+        state = wait_for(jobs, jobs.submit(crash))
+        assert state['status'] == 'failed' and 'BrokenProcessPool' in state['error']
+
+        key = jobs.submit(double, 21) #the broken pool is replaced
+        assert wait_for(jobs, key)['status'] == 'done'
+        assert jobs.result(key) == 42
+    finally:
+        jobs.shutdown()
+
+
+def test_the_store_keeps_the_newest_finished_jobs(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'), max_finished=2)
+    for key in ['a', 'b', 'c']:
+        store.queue(key)
+        store.update(key, 'done', result=key)
+    store.queue('d') #queued and running jobs are never evicted
+    assert store.get('a') is None
+    assert [store.result(key) for key in ['b', 'c']] == ['b', 'c']
+    assert store.get('d')['status'] == 'queued'
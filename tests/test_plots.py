@@ -0,0 +1,17 @@
+import pandas as pd
+import pytest
+
+from myProject.sqlPlots import bin_points, ols_trendlines
+
+
+def test_trendlines_keep_the_disciplines_apart():
+    df = pd.DataFrame({
+        'Gender': ['w', 'w', 'w', 'm', 'm', 'm'],
+        'Apparatus': ['FX'] * 6,
+        'D_Score': [5.0, 5.5, 6.0, 5.0, 5.5, 6.0],
+        'E_Score': [7.0, 7.5, 8.0, 9.0, 8.5, 8.0],
+    })
+    trendlines = ols_trendlines(df)
+    assert trendlines.index.tolist() == ['FX', 'm_FX']
+    assert trendlines['slope'].tolist() == pytest.approx([1.0, -1.0])
+    assert sorted(bin_points(df)['Event'].unique()) == ['FX', 'm_FX']
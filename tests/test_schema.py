@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from myProject.schema import SchemaOutdated, ensure_schema
+from myProject.sqlPlots import query_pivoted_database
+
+
+def results_count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+def test_reads_refuse_an_outdated_schema(raw_database):
+    with open(raw_database, 'rb') as f:
+        before = f.read()
+    with pytest.raises(SchemaOutdated):
+        query_pivoted_database(database=raw_database)
+    with open(raw_database, 'rb') as f:
+        assert f.read() == before #a read never migrates
+
+
+def test_gym_insert_needs_no_python_functions(database):
+    count = results_count(database)
+    with sqlite3.connect(database) as conn: #a plain client, without db.register_functions
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(gym)')]
+        row = dict(zip(columns, conn.execute('SELECT * FROM gym WHERE Score IS NOT NULL LIMIT 1').fetchone()))
+        row.update(LastName='TESTER', FirstName='Tess', Competition='Test Cup', Date='SAT 1 JAN 2050', Score=14.0)
+        conn.execute(f'INSERT INTO gym ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})', [row[column] for column in columns])
+
+    assert results_count(database) == count + 1
+    with sqlite3.connect(database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM athletes WHERE LastName = 'TESTER' AND FirstName = 'Tess' AND Country = ?", (row['Country'],)).fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM competitions WHERE Competition = 'Test Cup' AND Date = 'SAT 1 JAN 2050'").fetchone()[0] == 1
+        stored = conn.execute("SELECT Apparatus, Score FROM gym WHERE LastName = 'TESTER' AND Competition = 'Test Cup'").fetchall()
+    assert stored == [(row['Apparatus'], 14.0)]
+
+
+class WithoutMathFunctions:
+    """
+    A connection of an SQLite built without SQLITE_ENABLE_MATH_FUNCTIONS
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if 'exp(' in sql or 'ln(' in sql:
+            raise sqlite3.OperationalError('no such function: exp')
+        return self.conn.execute(sql, *args)
+
+
+def test_migration_refuses_an_sqlite_without_math_functions(raw_database):
+    with open(raw_database, 'rb') as f:
+        before = f.read()
+    with sqlite3.connect(raw_database) as conn:
+        with pytest.raises(RuntimeError, match='math functions'):
+            ensure_schema(WithoutMathFunctions(conn))
+    with open(raw_database, 'rb') as f:
+        assert f.read() == before #nothing was changed before the check
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from myProject.ingest import ingest_csv
+from myProject.simulations import SIMULATION_CHUNK_SIZE, monte_carlo
+from myProject.sqlPlots import pivot_events, query_pivoted_database
+
+
+def test_seeded_monte_carlo_does_not_depend_on_workers(database):
+    df = query_pivoted_database(database=database)
+    n_simulations = 3 * SIMULATION_CHUNK_SIZE #several chunks, so two workers really split the run
+    serial = monte_carlo(df.copy(), n_simulations=n_simulations, seed=7, n_workers=1)
+    parallel = monte_carlo(df.copy(), n_simulations=n_simulations, seed=7, n_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert serial[['gold', 'silver', 'bronze']].to_numpy().sum() > 0
+
+    pd.testing.assert_frame_equal(serial, monte_carlo(df.copy(), n_simulations=n_simulations, seed=7)) #the same seed repeats the run
+    other = monte_carlo(df.copy(), n_simulations=n_simulations, seed=8).loc[serial.index]
+    assert not serial[['gold', 'silver', 'bronze']].equals(other[['gold', 'silver', 'bronze']])
+
+
+def test_every_medal_is_awarded_once_with_both_disciplines(database, results_csv):
+    ingest_csv(results_csv, database) #adds the men's results, whose names end in non-breaking spaces and some genders are mislabelled
+    df = query_pivoted_database(database=database)
+    assert not df['AthleteID'].duplicated().any()
+    n_simulations = 2_000
+    medals = monte_carlo(df, n_simulations=n_simulations, seed=1)[['gold', 'silver', 'bronze']].to_numpy().sum(axis=0)
+    assert (medals == n_simulations * len(pivot_events(df))).all()
+
+
+def test_repeated_athletes_are_refused(database):
+    df = query_pivoted_database(database=database)
+    with pytest.raises(ValueError, match='same AthleteID'):
+        monte_carlo(pd.concat([df, df.iloc[:1]], ignore_index=True), n_simulations=100, seed=1)
+
+
+def test_athletes_sharing_a_surname_keep_their_own_medals():
+    df = pd.DataFrame({
+        'LastName': ['SMITH', 'SMITH', 'JONES', 'SMITH'],
+        'FirstName': ['Ann', 'Beth', 'Cara', 'Dee'],
+        'Country': ['USA', 'USA', 'GBR', 'CAN'],
+        'Gender': 'w',
+        'BB_PredictedScore': [15.0, 14.0, 13.0, 12.0], #10 noise standard deviations apart, so the podium never changes
+    })
+    results = monte_carlo(df, n_simulations=1_000, seed=0).set_index('FirstName')[['gold', 'silver', 'bronze']]
+    assert results.loc[['Ann', 'Beth', 'Cara', 'Dee']].to_numpy().tolist() == [[1_000, 0, 0], [0, 1_000, 0], [0, 0, 1_000], [0, 0, 0]]
+
+
+def test_normal_noise_model_uses_each_athletes_spread():
+    df = pd.DataFrame({
+        'LastName': ['STEADY', 'ERRATIC', 'THIRD', 'FOURTH'],
+        'FirstName': 'Test',
+        'Country': ['USA', 'GBR', 'CHN', 'JPN'],
+        'Gender': 'w',
+        'BB_PredictedScore': [15.0, 14.5, 12.0, 11.0],
+        'BB_StdDevScore': [0.05, 1.0, 0.05, 0.05],
+        'BB_CompetitionsCount': [20, 20, 20, 20], #enough history to keep their own spread
+    })
+    n_simulations = 2_000
+    fixed = monte_carlo(df.copy(), n_simulations=n_simulations, seed=0).set_index('LastName')
+    normal = monte_carlo(df.copy(), n_simulations=n_simulations, seed=0, noise_model='normal').set_index('LastName')
+    assert fixed.loc['ERRATIC', 'gold'] == 0 #5 standard deviations of 0.1 behind
+    assert 0.2 * n_simulations < normal.loc['ERRATIC', 'gold'] < 0.45 * n_simulations #P(N(-0.5, about 1) > 0) is about 0.31
+
+    with pytest.raises(ValueError, match='include_spread'):
+        monte_carlo(df.drop(columns=['BB_StdDevScore']), n_simulations=10, noise_model='normal')
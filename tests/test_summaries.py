@@ -0,0 +1,39 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from myProject.db import write_connection
+from myProject.ingest import ingest_csv
+from myProject.schema import refresh_athlete_apparatus_form, refresh_athlete_apparatus_stats
+
+KEY = ['Country', 'LastName', 'FirstName', 'Gender', 'Apparatus']
+
+
+def read_table(path, table):
+    with sqlite3.connect(path) as conn:
+        return pd.read_sql(f'SELECT * FROM {table} ORDER BY {", ".join(KEY)}', conn)
+
+
+def test_stats_trigger_matches_rebuild(database, results_csv):
+    assert ingest_csv(results_csv, database)['inserted'] > 0 #every new row goes through the trigger
+    stats = read_table(database, 'athlete_apparatus_stats')
+    with write_connection(database) as conn:
+        refresh_athlete_apparatus_stats(conn)
+    rebuilt = read_table(database, 'athlete_apparatus_stats')
+
+    pd.testing.assert_frame_equal(stats[KEY + ['n', 'competitions']], rebuilt[KEY + ['n', 'competitions']])
+    for column in ['sum_score', 'm2', 'max_score']:
+        np.testing.assert_allclose(stats[column], rebuilt[column], rtol=1e-9, atol=1e-9)
+
+
+def test_form_trigger_matches_rebuild(database, results_csv):
+    assert ingest_csv(results_csv, database)['inserted'] > 0
+    form = read_table(database, 'athlete_apparatus_form')
+    with write_connection(database) as conn:
+        refresh_athlete_apparatus_form(conn)
+    rebuilt = read_table(database, 'athlete_apparatus_form')
+
+    pd.testing.assert_frame_equal(form[KEY + ['last_date']], rebuilt[KEY + ['last_date']])
+    for column in ['decayed_sum', 'decayed_weight']:
+        np.testing.assert_allclose(form[column], rebuilt[column], rtol=1e-9, atol=1e-9)
@@ -0,0 +1,21 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from myProject.team import best_team, team_score
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('n_events', [4, 6]) #the women's and the men's apparatus
+def test_best_team_matches_brute_force(seed, n_events):
+    rng = np.random.default_rng(seed)
+    scores = rng.uniform(11, 15, size=(12, n_events))
+    scores[rng.random(scores.shape) < 0.3] = 0 #specialists who skip some apparatus
+
+    members, score, _ = best_team(scores, team_size=5, count=3)
+
+    brute_force = max(team_score(scores, team, count=3) for team in combinations(range(len(scores)), 5))
+    assert len(set(members)) == 5
+    assert score == pytest.approx(brute_force)
+    assert team_score(scores, members, count=3) == pytest.approx(score)
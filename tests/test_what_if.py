@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from myProject.simulations import build_baseline, what_if
+from myProject.sqlPlots import pivot_events
+
+
+def test_what_if_matches_simulating_the_whole_field():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'LastName': [f'ATHLETE{i}' for i in range(6)],
+        'FirstName': 'Test',
+        'Country': ['USA', 'GBR', 'CHN', 'JPN', 'BRA', 'ITA'],
+        'Gender': 'w',
+    })
+    for event in ['VT', 'UB', 'BB', 'FX']:
+        df[f'{event}_PredictedScore'] = 13.5 + rng.normal(0, 0.15, len(df)) #close enough for every podium to change between simulations
+    df.loc[1, 'UB_PredictedScore'] = np.nan
+    new = {'BB': 13.6, 'VT': np.nan, 'FX': 13.4, 'UB': np.nan}
+    n_simulations = 500
+    baseline = build_baseline(df, n_simulations=n_simulations, seed=3)
+
+    results = what_if(baseline, 'Hope', 'NEW', 'CAN', new['BB'], new['VT'], new['FX'], new['UB'])
+
+    # brute force: draw the field's scores and the new athlete's from the same streams and rank everybody in every simulation
+    baseline_seed, what_if_seed = np.random.SeedSequence(3).spawn(2)
+    field_rng, new_rng = np.random.default_rng(baseline_seed), np.random.default_rng(what_if_seed)
+    medals = np.zeros((len(df) + 1, 3), dtype=np.int64)
+    for event in pivot_events(df):
+        means = df[f'{event}_PredictedScore'].to_numpy()
+        entered = np.flatnonzero(~np.isnan(means))
+        scores = np.full((n_simulations, len(df) + 1), -np.inf)
+        scores[:, entered] = means[entered] + field_rng.normal(0, 0.1, size=(n_simulations, len(entered)))
+        new_scores = new[event] + new_rng.normal(0, 0.1, size=n_simulations)
+        if not np.isnan(new[event]):
+            scores[:, len(df)] = new_scores
+        for simulation in np.argsort(-scores, axis=1)[:, :3]:
+            medals[simulation, [0, 1, 2]] += 1
+
+    np.testing.assert_array_equal(results.sort_index()[['gold', 'silver', 'bronze']].to_numpy(), medals)
+    assert medals[len(df)].sum() > 0
@@ -1,14 +1,23 @@
+import os
+import sys
+from functools import lru_cache
+
 import dash
 from dash import dcc, html
 import pandas as pd
 import plotly.express as px
 
 # Import the function from visualizations.py
-from visualizations import scatterplot_by_country
+from visualizations import boxplot_by_country, scatterplot_by_country
 
 # Load dataset to get the list of unique countries
 df = pd.read_csv("data_2022_2023.csv")
 df['Country'] = df['Country'].str.strip().str.upper()  # Normalize country names
+df = df.sort_values('Country', kind='stable').reset_index(drop=True)  # rows of each country are contiguous
+COUNTRY_ROWS = {country: slice(rows[0], rows[-1] + 1) for country, rows in df.groupby('Country', sort=False).indices.items()}  # built once, each callback slices instead of scanning every row
+DATA_VERSION = os.stat("data_2022_2023.csv").st_mtime_ns  # changes whenever the dataset file changes
+
+FIGURE_CACHE_SIZE = 512  # serialized country figures kept in memory, two plot types per country
 
 # Initialize Dash app
 app = dash.Dash(__name__)
@@ -40,6 +49,26 @@ app.layout = html.Div([
     dcc.Graph(id='medals-plot')  # This graph updates based on the dropdown & toggle
 ])
 
+# Builds the plot of a country for the selected plot type
+def build_country_plot(selected_country, plot_type):
+    filtered_data = df.iloc[COUNTRY_ROWS.get(selected_country, slice(0, 0))]
+
+    if filtered_data.empty:
+        # Return an empty graph if no data is available for the selected country
+        return px.scatter(title=f"No Data Available for {selected_country}")
+
+    if plot_type == "scatter":
+        return scatterplot_by_country(selected_country, filtered_data)  # Calls scatter function
+    else:
+        # Quartiles, whiskers and outliers are computed server-side, only those are sent to the browser
+        return boxplot_by_country(selected_country, filtered_data)
+# The same inputs always give the same figure, so serialized figures are kept in a bounded LRU cache.
+# The dataset version is part of the key, so figures of an older dataset are never served
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def render_country_plot(selected_country, plot_type, data_version):
+    return build_country_plot(selected_country, plot_type).to_dict()
+
+
 # Callback to update the plot based on user selection
 @app.callback(
     dash.Output('country-plot', 'figure'),
@@ -47,105 +76,34 @@ app.layout = html.Div([
      dash.Input('plot-type', 'value')]
 )
 def update_plot(selected_country, plot_type):
-    filtered_data = df[df['Country'] == selected_country]
+    return render_country_plot(selected_country, plot_type, DATA_VERSION)
 
-    if filtered_data.empty:
-        # Return an empty graph if no data is available for the selected country
-        return px.scatter(title=f"No Data Available for {selected_country}")
 
-    if plot_type == "scatter":
-        return scatterplot_by_country(selected_country)  # Calls scatter function
-    else:
-        # Restore the original Box Plot
-        fig = px.box(
-            filtered_data, 
-            x="Apparatus",
-            y="Score", 
-            color="Apparatus",
-            title=f"Gymnastics Score Distribution for {selected_country}",
-            labels={"Apparatus": "Event", "Score": "Final Score"},
-            points="all"  # Show all points (outliers included)
-        )
-
-        # Layout adjustments for spacing & readability
-        fig.update_layout(
-            xaxis={'tickangle': -45},  # Rotate event labels for better spacing
-            xaxis_title="Event",
-            yaxis_title="Final Score",
-            margin=dict(l=40, r=40, t=60, b=120)
-        )
-
-        # Restore annotation box for explaining Box Plot
-        fig.add_annotation(
-            x=0.5, y=-0.2,
-            text="🔹 Box represents the middle 50% of scores (Q1 to Q3).<br>"
-                 "🔹 Line inside the box = Median (middle score).<br>"
-                 "🔹 Whiskers extend to non-outlier min/max scores.<br>"
-                 "🔹 Dots outside whiskers = Outliers (exceptionally high/low scores).",
-            showarrow=False,
-            xref="paper", yref="paper",
-            font=dict(size=14, color="black"),
-            align="center",
-            bordercolor="black",
-            borderwidth=2,
-            bgcolor="white",
-            opacity=0.95
-        )
-
-        return fig
 @app.callback(
     dash.Output('medals-plot', 'figure'),
     [dash.Input('country-dropdown', 'value'),
      dash.Input('plot-type', 'value')]
 )
 def update_medals_plot(selected_country, plot_type):
-    filtered_data = df[df['Country'] == selected_country]
+    return render_country_plot(selected_country, plot_type, DATA_VERSION)
 
-    if filtered_data.empty:
-        # Return an empty graph if no data is available for the selected country
-        return px.scatter(title=f"No Data Available for {selected_country}")
 
-    if plot_type == "scatter":
-        return scatterplot_by_country(selected_country)  # Calls scatter function
-    else:
-        # Restore the original Box Plot
-        fig = px.box(
-            filtered_data, 
-            x="Apparatus",
-            y="Score", 
-            color="Apparatus",
-            title=f"Gymnastics Score Distribution for {selected_country}",
-            labels={"Apparatus": "Event", "Score": "Final Score"},
-            points="all"  # Show all points (outliers included)
-        )
-
-        # Layout adjustments for spacing & readability
-        fig.update_layout(
-            xaxis={'tickangle': -45},  # Rotate event labels for better spacing
-            xaxis_title="Event",
-            yaxis_title="Final Score",
-            margin=dict(l=40, r=40, t=60, b=120)
-        )
-
-        # Restore annotation box for explaining Box Plot
-        fig.add_annotation(
-            x=0.5, y=-0.2,
-            text="🔹 Box represents the middle 50% of scores (Q1 to Q3).<br>"
-                 "🔹 Line inside the box = Median (middle score).<br>"
-                 "🔹 Whiskers extend to non-outlier min/max scores.<br>"
-                 "🔹 Dots outside whiskers = Outliers (exceptionally high/low scores).",
-            showarrow=False,
-            xref="paper", yref="paper",
-            font=dict(size=14, color="black"),
-            align="center",
-            bordercolor="black",
-            borderwidth=2,
-            bgcolor="white",
-            opacity=0.95
-        )
-
-        return fig
+# Cache hit/miss counters
+@app.server.route('/figure-cache')
+def figure_cache_stats():
+    return dict(render_country_plot.cache_info()._asdict(), data_version=DATA_VERSION)
+
+
+def warm_figure_cache():
+    """
+    Pre-renders every country and plot type so the first view of each one is served from the cache
+    """
+    for country in df['Country'].unique():
+        for plot_type in ["scatter", "box"]:
+            render_country_plot(country, plot_type, DATA_VERSION)
 
 # Run the app
 if __name__ == '__main__':
+    if '--warm-cache' in sys.argv:
+        warm_figure_cache()
     app.run_server(debug=True)